@@ -0,0 +1,11 @@
+"""
+Load benchmarks for the social media app.
+
+    python -m bench.run --users 500 --requests 200
+
+generates a reproducible synthetic social graph (see bench.dataset) in the
+configured database, then drives the main pages through the Flask test
+client and reports throughput, p50/p95/p99 latency and queries per request.
+Everything runs in-process against the local database, so no network
+access is needed. Point it at an empty, throwaway database.
+"""
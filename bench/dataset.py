@@ -0,0 +1,155 @@
+"""
+Reproducible synthetic dataset generator.
+
+The same seed and sizes always produce the same users, posts, reactions,
+comments, replies, friendships and pending friend requests, so benchmark
+runs can be compared with each other.
+"""
+import random
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from website import get_db_connection
+
+FIRST_NAMES = ["Ada", "Ben", "Chioma", "David", "Efe", "Fatima", "Grace", "Hassan", "Ifeoma", "Joseph",
+               "Kemi", "Liam", "Maria", "Nnamdi", "Olivia", "Peter", "Queen", "Rita", "Samuel", "Tunde"]
+LAST_NAMES = ["Adeyemi", "Brown", "Chukwu", "Davies", "Eze", "Fashola", "Garcia", "Hughes", "Ibrahim",
+              "Johnson", "Kalu", "Lopez", "Musa", "Nwosu", "Okafor", "Peters", "Smith", "Taylor"]
+WORDS = ["travel", "food", "python", "flask", "music", "weekend", "coffee", "design", "sunset", "family",
+         "football", "startup", "reading", "lagos", "beach", "coding", "photography", "garden", "movie", "run"]
+CATEGORIES = ["General", "Technology", "Lifestyle", "Travel", "Food"]
+IMAGES = [None, None, None, "paac_director_1762274029.jpeg", "download_6_1761987471.jfif"]
+PASSWORD = "password123"
+
+BATCH_SIZE = 1000
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _insert_many(cursor, sql, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(sql, rows[start:start + BATCH_SIZE])
+
+
+def generate(users=200, posts_per_user=5, likes_per_post=8, dislikes_per_post=2, comments_per_post=3,
+             replies_per_comment=1, friends_per_user=10, requests_per_user=3, seed=42):
+    """Fill an empty database with a synthetic social graph; returns row counts.
+
+    Counts are averages: each post, user, etc. gets a random number around
+    the given value. All bench users share the password PASSWORD.
+    """
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1)
+    password = generate_password_hash(PASSWORD, method="pbkdf2:sha256")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) AS count FROM user")
+    if cursor.fetchone()['count']:
+        conn.close()
+        raise RuntimeError("The benchmark dataset must be generated into an empty database.")
+
+    try:
+        _insert_many(
+            cursor,
+            """INSERT INTO user (first_name, last_name, email, password, profile_picture, bio, date_joined)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            [(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"bench{seed}_{i}@example.com", password,
+              "default_profile_photo.jpg", _sentence(rng, 8), now - timedelta(days=rng.randint(30, 900)))
+             for i in range(users)]
+        )
+        cursor.execute("SELECT id FROM user ORDER BY id")
+        user_ids = [r['id'] for r in cursor.fetchall()]
+
+        posts = []
+        for user_id in user_ids:
+            for _ in range(rng.randint(0, posts_per_user * 2)):
+                posts.append((_sentence(rng, 4), _sentence(rng, rng.randint(10, 60)), rng.choice(IMAGES),
+                              rng.choice(CATEGORIES), ",".join(rng.sample(WORDS, 3)), rng.random() < 0.05,
+                              now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)), user_id))
+        _insert_many(
+            cursor,
+            """INSERT INTO post (title, content, image, category, tags, drafts, date, user_id)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+            posts
+        )
+        cursor.execute("SELECT id, date FROM post ORDER BY id")
+        post_rows = cursor.fetchall()
+
+        likes, dislikes, comments = [], [], []
+        for post in post_rows:
+            reactors = rng.sample(user_ids, min(len(user_ids), rng.randint(0, (likes_per_post + dislikes_per_post) * 2)))
+            split = int(len(reactors) * likes_per_post / max(likes_per_post + dislikes_per_post, 1))
+            likes += [(u, post['id']) for u in reactors[:split]]
+            dislikes += [(u, post['id']) for u in reactors[split:]]
+            for _ in range(rng.randint(0, comments_per_post * 2)):
+                comments.append((rng.choice(user_ids), post['id'], _sentence(rng, rng.randint(3, 20)),
+                                 post['date'] + timedelta(minutes=rng.randint(1, 5000))))
+        _insert_many(cursor, "INSERT INTO `like` (user_id, post_id) VALUES (%s, %s)", likes)
+        _insert_many(cursor, "INSERT INTO dislike (user_id, post_id) VALUES (%s, %s)", dislikes)
+        _insert_many(cursor, "INSERT INTO comment (user_id, post_id, data, date) VALUES (%s, %s, %s, %s)", comments)
+
+        cursor.execute("SELECT id, post_id, date FROM comment ORDER BY id")
+        replies = []
+        for comment in cursor.fetchall():
+            for _ in range(rng.randint(0, replies_per_comment * 2)):
+                replies.append((rng.choice(user_ids), comment['id'], comment['post_id'], _sentence(rng, 6),
+                                comment['date'] + timedelta(minutes=rng.randint(1, 600))))
+        _insert_many(
+            cursor,
+            "INSERT INTO reply_comment (user_id, comment_id, post_id, data, date) VALUES (%s, %s, %s, %s, %s)",
+            replies
+        )
+
+        # Friendships are stored in both directions; requests only between strangers
+        pairs = set()
+        for user_id in user_ids:
+            for other in rng.sample(user_ids, min(len(user_ids), rng.randint(0, friends_per_user))):
+                if other != user_id:
+                    pairs.add((min(user_id, other), max(user_id, other)))
+        friendships = []
+        for a, b in sorted(pairs):
+            created = now - timedelta(days=rng.randint(0, 365))
+            friendships += [(a, b, created), (b, a, created)]
+        _insert_many(cursor, "INSERT INTO friendship (user1_id, user2_id, date_created) VALUES (%s, %s, %s)", friendships)
+
+        requests = {}
+        for user_id in user_ids:
+            for other in rng.sample(user_ids, min(len(user_ids), rng.randint(0, requests_per_user * 2))):
+                key = (min(user_id, other), max(user_id, other))
+                if other != user_id and key not in pairs and key not in requests:
+                    requests[key] = (user_id, other, now - timedelta(hours=rng.randint(1, 2000)))
+        _insert_many(
+            cursor,
+            "INSERT INTO friend_request (sender_id, receiver_id, status, date_sent) VALUES (%s, %s, 'pending', %s)",
+            list(requests.values())
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+    conn.close()
+
+    # Derived data the app maintains incrementally in production
+    from website.migrations import backfill_timelines
+    from website.models import TIMELINE_MAX_LENGTH, reconcile_post_counters
+    reconcile_post_counters()
+    conn = get_db_connection()
+    backfill_timelines(conn.cursor(), TIMELINE_MAX_LENGTH)
+    conn.commit()
+    conn.close()
+
+    return {
+        'users': len(user_ids),
+        'posts': len(post_rows),
+        'likes': len(likes),
+        'dislikes': len(dislikes),
+        'comments': len(comments),
+        'replies': len(replies),
+        'friendships': len(pairs),
+        'friend_requests': len(requests),
+    }
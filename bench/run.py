@@ -0,0 +1,148 @@
+"""
+Drive the main pages with the Flask test client and report latency.
+
+    python -m bench.run [--users N] [--requests N] [--threads N] [--skip-generate]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from bench.dataset import WORDS, generate
+from website.profiler import last_request
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+def scenarios(rng, post_ids):
+    """(name, method, url) for one round of requests."""
+    post_id = rng.choice(post_ids)
+    return [
+        ("home", "GET", "/home/"),
+        ("home friends", "GET", "/home/?feed=friends"),
+        ("search", "GET", f"/search/{rng.choice(WORDS)}"),
+        ("find people", "GET", "/find_people"),
+        ("post detail", "GET", f"/post/{post_id}"),
+        ("like", "POST", f"/post/{post_id}/like"),
+        ("dislike", "POST", f"/post/{post_id}/dislike"),
+    ]
+
+
+def _worker(app, user_ids, post_ids, rounds, seed, results, lock):
+    rng = random.Random(seed)
+    client = app.test_client()
+    # Log in by session rather than through the form, so password hashing isn't measured
+    with client.session_transaction() as session:
+        session['_user_id'] = str(rng.choice(user_ids))
+        session['_fresh'] = True
+
+    local = {}
+    for _ in range(rounds):
+        for name, method, url in scenarios(rng, post_ids):
+            started = time.perf_counter()
+            response = client.open(url, method=method, headers={'Accept': 'application/json'} if method == "POST" else {})
+            # Streamed pages are still rendering here; read the whole body before stopping the clock
+            response.get_data()
+            response.close()
+            elapsed = time.perf_counter() - started
+            stats = local.setdefault(name, {'latencies': [], 'queries': [], 'errors': 0})
+            stats['latencies'].append(elapsed)
+            stats['queries'].append(last_request()['queries'])
+            if response.status_code >= 400:
+                stats['errors'] += 1
+
+    with lock:
+        for name, stats in local.items():
+            merged = results.setdefault(name, {'latencies': [], 'queries': [], 'errors': 0})
+            merged['latencies'] += stats['latencies']
+            merged['queries'] += stats['queries']
+            merged['errors'] += stats['errors']
+
+
+def run(app, requests=100, threads=1, seed=42):
+    """Run `requests` rounds of every scenario spread over `threads`; returns a report."""
+    from website import get_db_connection
+
+    with app.app_context():
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM user")
+        user_ids = [r['id'] for r in cursor.fetchall()]
+        cursor.execute("SELECT id FROM post WHERE drafts = FALSE")
+        post_ids = [r['id'] for r in cursor.fetchall()]
+    if not user_ids or not post_ids:
+        raise RuntimeError("No data to benchmark; generate a dataset first.")
+
+    results, lock = {}, threading.Lock()
+    per_thread = max(requests // threads, 1)
+    workers = [threading.Thread(target=_worker, args=(app, user_ids, post_ids, per_thread, seed + i, results, lock))
+               for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+
+    report = {}
+    for name, stats in results.items():
+        latencies = sorted(stats['latencies'])
+        report[name] = {
+            'requests': len(latencies),
+            'throughput_rps': len(latencies) / wall if wall else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'queries_per_request': sum(stats['queries']) / len(stats['queries']),
+            'errors': stats['errors'],
+        }
+    return report
+
+
+def print_report(report):
+    header = f"{'scenario':<14}{'reqs':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report.items():
+        print(f"{name:<14}{row['requests']:>7}{row['throughput_rps']:>9.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['queries_per_request']:>9.1f}{row['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the social media app.")
+    parser.add_argument("--users", type=int, default=200, help="synthetic users to generate")
+    parser.add_argument("--posts-per-user", type=int, default=5)
+    parser.add_argument("--friends-per-user", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100, help="rounds of every scenario")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-generate", action="store_true", help="reuse the data already in the database")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    from main import app
+    from website import create_database
+    app.config['TESTING'] = True
+
+    if not args.skip_generate:
+        create_database()
+        counts = generate(users=args.users, posts_per_user=args.posts_per_user,
+                          friends_per_user=args.friends_per_user, seed=args.seed)
+        print("📦 Generated dataset: " + ", ".join(f"{n} {k}" for k, n in counts.items()))
+
+    report = run(app, requests=args.requests, threads=args.threads, seed=args.seed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process caches (no database needed)
+"""
+import multiprocessing
+import socket
+import time
+
+from website.cache import (
+    FragmentCache, SharedBackend, TTLCache, connect_shared_store, serve_shared_store
+)
+
+
+def test_hits_and_misses():
+    """Lookups are counted as hits or misses"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get(1) is None
+    cache.set(1, "alice")
+    assert cache.get(1) == "alice"
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+
+
+def test_ttl_expiry():
+    """Entries disappear once their TTL has passed"""
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set(1, "alice")
+    time.sleep(0.02)
+    assert cache.get(1) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_lru_eviction():
+    """The least recently used entry is evicted when full"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)
+    cache.set(3, "c")
+    assert cache.get(2) is None
+    assert cache.get(1) == "a" and cache.get(3) == "c"
+
+
+def test_invalidate():
+    """invalidate() drops a single entry"""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(1, "alice")
+    cache.set(2, "bob")
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    assert cache.get(2) == "bob"
+
+
+def test_fragment_cache_renders_once():
+    """A fragment is rendered on the first request and served from cache after"""
+    cache = FragmentCache(TTLCache(maxsize=10, ttl=60))
+    calls = []
+
+    def render():
+        calls.append(1)
+        return "<p>post</p>"
+
+    assert cache.get_or_render("home:1:v1", render) == "<p>post</p>"
+    assert cache.get_or_render("home:1:v1", render) == "<p>post</p>"
+    assert len(calls) == 1
+    # A bumped version is a different key, so it renders again
+    cache.get_or_render("home:1:v2", render)
+    assert len(calls) == 2
+    assert cache.stats()['hits'] == 1
+
+
+def test_fragment_keys_carry_the_deploy_salt():
+    """Post cards cached under one ETAG_SALT are not reused under another"""
+    from main import app
+    from website import cache
+    from website.views import render_post_cards
+    keys = []
+
+    class Recorder:
+        def get(self, key, default=None):
+            keys.append(key)
+            return "<p>cached</p>"
+
+    saved = cache.fragment_cache
+    cache.fragment_cache = FragmentCache(Recorder())
+    item = {'post': {'id': 5, 'version': 2}, 'user': {'id': 3, 'version': 1}}
+    try:
+        with app.app_context():
+            for salt in ("release-1", "release-2"):
+                app.config['ETAG_SALT'], previous = salt, app.config['ETAG_SALT']
+                try:
+                    render_post_cards([dict(item)], "home_card")
+                finally:
+                    app.config['ETAG_SALT'] = previous
+    finally:
+        cache.fragment_cache = saved
+    assert keys == ["release-1:home_card:5:v2:u3:v1", "release-2:home_card:5:v2:u3:v1"]
+
+
+def test_shared_backend_across_processes():
+    """Fragments stored through the stand-in shared store are visible to other clients, up to its size"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    address, authkey = ("127.0.0.1", port), b"test"
+    server = multiprocessing.Process(target=serve_shared_store, args=(address, authkey, 3), daemon=True)
+    server.start()
+    try:
+        for _ in range(50):
+            try:
+                store = connect_shared_store(address, authkey)
+                break
+            except OSError:
+                time.sleep(0.05)
+        first = FragmentCache(SharedBackend(store))
+        second = FragmentCache(SharedBackend(connect_shared_store(address, authkey)))
+        first.get_or_render("search:5:v1", lambda: "<p>shared</p>")
+        assert second.get_or_render("search:5:v1", lambda: "<p>other</p>") == "<p>shared</p>"
+        assert second.stats()['hits'] == 1
+
+        # The store is an LRU: the oldest fragments make way for new ones
+        for n in range(3):
+            first.get_or_render(f"search:6:v{n}", lambda: "<p>newer</p>")
+        assert store.get("search:5:v1") is None and store.get("search:6:v2") == "<p>newer</p>"
+    finally:
+        server.terminate()
+        server.join()
+
+
+def test_shared_store_requires_an_authkey():
+    """Without FRAGMENT_CACHE_AUTHKEY the store won't serve or connect, and workers stay local"""
+    import os
+    from website import cache
+    for function in (serve_shared_store, connect_shared_store):
+        try:
+            function(("127.0.0.1", 0), b"")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+    saved = {name: os.environ.pop(name, None) for name in ("FRAGMENT_CACHE_ADDRESS", "FRAGMENT_CACHE_AUTHKEY")}
+    try:
+        os.environ["FRAGMENT_CACHE_ADDRESS"] = "127.0.0.1:1"
+        assert cache.shared_store_authkey() is None
+        assert isinstance(cache._fragment_backend(), TTLCache)
+    finally:
+        for name, value in saved.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+
+
+def main():
+    print("🧪 Testing Caches")
+    print("=" * 40)
+    tests = [
+        test_hits_and_misses,
+        test_ttl_expiry,
+        test_lru_eviction,
+        test_invalidate,
+        test_fragment_cache_renders_once,
+        test_fragment_keys_carry_the_deploy_salt,
+        test_shared_backend_across_processes,
+        test_shared_store_requires_an_authkey,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
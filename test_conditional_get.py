@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Tests for conditional GET on the home, post and profile pages: a repeat
+request with the page's ETag gets a 304 until something on the page changes
+(uses a temporary SQLite database)
+"""
+from website import models
+from test_sqlite_backend import make_user, sqlite_database
+
+
+def client_for(user_id):
+    from main import app
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': f'"{etag}"'})
+
+
+def test_home_answers_304_until_the_feed_changes():
+    """The feed's ETag survives a refresh and changes with a new post or reaction"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        post_id = models.create_post_with_image("Hello", "First post", ada)
+        client = client_for(ben)
+
+        first = client.get("/home/")
+        etag, _ = first.get_etag()
+        assert first.status_code == 200 and first.headers['Cache-Control'] == 'private, no-cache'
+
+        cached = revalidate(client, "/home/", etag)
+        assert cached.status_code == 304 and cached.data == b""
+        assert int(cached.headers['X-DB-Queries']) <= 2
+
+        models.toggle_reaction(ada, post_id, "like")
+        assert revalidate(client, "/home/", etag).status_code == 200
+        etag, _ = client.get("/home/").get_etag()
+        models.create_post_with_image("Again", "Second post", ada)
+        assert revalidate(client, "/home/", etag).status_code == 200
+
+
+def test_post_page_follows_its_thread():
+    """A reply on the post changes the post page's ETag"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        post_id = models.create_post_with_image("Hello", "First post", ada)
+        models.add_comment(ben, post_id, "Nice")
+        comment_id = models.get_post_comments(post_id)[0]['id']
+        client = client_for(ben)
+
+        etag, _ = client.get(f"/post/{post_id}").get_etag()
+        assert revalidate(client, f"/post/{post_id}", etag).status_code == 304
+        models.reply_to_comment(ada, comment_id, None, "Thanks")
+        assert revalidate(client, f"/post/{post_id}", etag).status_code == 200
+
+
+def test_post_page_follows_its_commenters():
+    """A commenter renaming themselves changes the post page's ETag"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        post_id = models.create_post_with_image("Hello", "First post", ada)
+        models.add_comment(ben, post_id, "Nice")
+        client = client_for(ada)
+
+        etag, _ = client.get(f"/post/{post_id}").get_etag()
+        cached = revalidate(client, f"/post/{post_id}", etag)
+        assert cached.status_code == 304 and int(cached.headers['X-DB-Queries']) <= 1
+        models.update_user(ben, {"first_name": "Benjamin"})
+        response = revalidate(client, f"/post/{post_id}", etag)
+        assert response.status_code == 200 and "Benjamin" in response.get_data(as_text=True)
+
+
+def test_more_replies_continue_after_the_inline_ones():
+    """The post page's replies link starts after the replies already shown inline"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        post_id = models.create_post_with_image("Hello", "First post", ada)
+        models.add_comment(ben, post_id, "Nice")
+        comment_id = models.get_post_comments(post_id)[0]['id']
+        for number in range(models.REPLY_PAGE_SIZE + 2):
+            models.reply_to_comment(ada, comment_id, None, f"Reply {number}")
+        client = client_for(ben)
+
+        html = client.get(f"/post/{post_id}").get_data(as_text=True)
+        link = html.split("View more replies")[0].rsplit('href="', 1)[1].split('"')[0]
+        assert "cursor=" in link
+        replies = client.get(link.replace("&amp;", "&")).get_data(as_text=True)
+        assert "Reply 0" not in replies and f"Reply {models.REPLY_PAGE_SIZE - 1}" not in replies
+        assert f"Reply {models.REPLY_PAGE_SIZE}" in replies and f"Reply {models.REPLY_PAGE_SIZE + 1}" in replies
+
+
+def test_profile_follows_the_relationship():
+    """A friend request between viewer and owner changes the profile's ETag"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        client = client_for(ben)
+
+        etag, _ = client.get(f"/profile/{ada}").get_etag()
+        assert revalidate(client, f"/profile/{ada}", etag).status_code == 304
+        models.send_friend_request(ada, ben)
+        assert revalidate(client, f"/profile/{ada}", etag).status_code == 200
+
+
+def test_profile_304_reads_only_the_shown_page():
+    """A 304 on a long profile stays within a few queries and follows its shown posts"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        for number in range(models.PROFILE_PAGE_SIZE * 3):
+            models.create_post_with_image(f"Post {number}", "Busy", ada)
+        client = client_for(ben)
+
+        etag, _ = client.get(f"/profile/{ada}").get_etag()
+        cached = revalidate(client, f"/profile/{ada}", etag)
+        assert cached.status_code == 304 and int(cached.headers['X-DB-Queries']) <= 2
+
+        newest = max(post['id'] for post in models.get_all_posts())
+        models.toggle_reaction(ben, newest, "like")
+        assert revalidate(client, f"/profile/{ada}", etag).status_code == 200
+
+
+def test_pending_flash_is_never_304():
+    """A waiting flash message forces a full render without an ETag"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        client = client_for(ada)
+        etag, _ = client.get("/home/").get_etag()
+
+        with client.session_transaction() as session:
+            session['_flashes'] = [('success', 'Post created successfully!')]
+        response = revalidate(client, "/home/", etag)
+        assert response.status_code == 200 and response.get_etag() == (None, None)
+        assert b"Post created successfully!" in response.data
+        assert revalidate(client, "/home/", etag).status_code == 304
+
+
+def main():
+    print("🧪 Testing Conditional GET")
+    print("=" * 40)
+    tests = [
+        test_home_answers_304_until_the_feed_changes,
+        test_post_page_follows_its_thread,
+        test_post_page_follows_its_commenters,
+        test_more_replies_continue_after_the_inline_ones,
+        test_profile_follows_the_relationship,
+        test_profile_304_reads_only_the_shown_page,
+        test_pending_flash_is_never_304,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
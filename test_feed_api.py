@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming NDJSON feed API (uses a temporary SQLite database)
+"""
+import json
+
+from website import models
+from test_sqlite_backend import make_user, sqlite_database
+from test_conditional_get import client_for
+
+
+def read_lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_feed_pages_lazily():
+    """next_cursor is filled in once the page has been read, and follows on"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        for n in range(5):
+            models.create_post_with_image(f"Post {n}", "Content", ada)
+
+        page = models.stream_feed(ada, limit=3)
+        assert page.next_cursor is None
+        items = list(page)
+        assert [i['post']['title'] for i in items] == ["Post 4", "Post 3", "Post 2"]
+        assert items[0]['user']['first_name'] == "Ada" and 'password' not in items[0]['user']
+
+        rest = models.stream_feed(ada, page.next_cursor, limit=3)
+        assert [i['post']['title'] for i in rest] == ["Post 1", "Post 0"] and rest.next_cursor is None
+
+
+def test_api_feed_streams_ndjson():
+    """Each line is one post with its author, the last one the next cursor"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        first = models.create_post_with_image("Hello", "First post", ada)
+        models.create_post_with_image("Again", "Second post", ada, "sunset.jpg")
+        models.create_post_with_image("Hidden", "Draft", ada, is_draft=True)
+        models.toggle_reaction(ben, first, "like")
+        client = client_for(ben)
+
+        response = client.get("/api/feed?limit=1")
+        assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+        item, trailer = read_lines(response)
+        assert item['post']['title'] == "Again" and item['user']['last_name'] == "Lovelace"
+        assert item['post']['image'] == "/static/uploads/sunset.jpg" and item['post']['image_card'] is None
+
+        item, trailer = read_lines(client.get(f"/api/feed?limit=1&cursor={trailer['next_cursor']}"))
+        assert item['post']['user_liked'] is True and item['post']['likes_count'] == 1
+        assert trailer == {'next_cursor': None}
+
+
+def test_api_feed_fields():
+    """fields= picks the post and author columns returned; unknown names are a 400"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        models.create_post_with_image("Hello", "First post", ada)
+        client = client_for(ada)
+
+        item, _ = read_lines(client.get("/api/feed?fields=id,title,user.first_name"))
+        assert set(item['post']) == {'id', 'title'} and item['user'] == {'first_name': "Ada"}
+
+        response = client.get("/api/feed?fields=title,user.password")
+        assert response.status_code == 400 and "user.password" in response.get_json()['error']
+
+
+def main():
+    print("🧪 Testing Feed API")
+    print("=" * 40)
+    tests = [
+        test_stream_feed_pages_lazily,
+        test_api_feed_streams_ndjson,
+        test_api_feed_fields,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for friend requests: race-free sending and bulk accept, reject and
+cancel in single transactions (uses a temporary SQLite database)
+"""
+from website import models
+from website.graph import friend_graph
+from test_sqlite_backend import make_user, sqlite_database
+from test_conditional_get import client_for
+
+
+def pending_ids(receiver_id):
+    return [r['id'] for r in models.get_pending_friend_requests(receiver_id)]
+
+
+def test_send_is_a_single_insert():
+    """A repeated send is refused; the other direction is a separate request"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        assert models.send_friend_request(ada, ben)
+        assert not models.send_friend_request(ada, ben)
+        assert models.send_friend_request(ben, ada)
+        assert len(pending_ids(ben)) == 1 and len(pending_ids(ada)) == 1
+
+
+def test_bulk_accept_only_touches_the_receivers_requests():
+    """Accepting many requests befriends every sender, but not someone else's requests"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        others = [make_user(f"Fan{n}", "Smith") for n in range(5)]
+        for other in others:
+            models.send_friend_request(other, ada)
+        models.send_friend_request(others[0], others[1])
+        # Crossing requests: accepting both must not trip the friendship key
+        models.send_friend_request(ada, others[0])
+        models.accept_friend_requests(others[0], pending_ids(others[0]))
+
+        stranger_request = pending_ids(others[1])
+        accepted = models.accept_friend_requests(ada, pending_ids(ada) + stranger_request)
+        assert accepted == 5
+        assert pending_ids(ada) == [] and pending_ids(others[1]) == stranger_request
+        assert all(models.are_friends(ada, other) and models.are_friends(other, ada) for other in others)
+        assert list(friend_graph.friends(ada)) == sorted(others)
+        assert models.accept_friend_requests(ada, []) == 0
+
+
+def test_bulk_reject_and_cancel():
+    """Reject acts on requests received, cancel on requests sent, and a cancelled request can be resent"""
+    with sqlite_database():
+        ada, ben, cy = make_user("Ada", "Lovelace"), make_user("Ben", "Brown"), make_user("Cy", "Chukwu")
+        models.send_friend_request(ben, ada)
+        models.send_friend_request(cy, ada)
+        models.send_friend_request(ada, ben)
+
+        assert models.reject_friend_requests(ben, pending_ids(ada)) == 0
+        assert models.reject_friend_requests(ada, pending_ids(ada)) == 2
+        assert not models.send_friend_request(ben, ada)
+
+        assert models.cancel_friend_requests(ben, pending_ids(ben)) == 0
+        assert models.cancel_friend_requests(ada, pending_ids(ben)) == 1
+        assert models.send_friend_request(ada, ben)
+
+
+def test_bulk_route():
+    """The bulk form accepts the checked requests with one POST"""
+    with sqlite_database():
+        ada, ben, cy = make_user("Ada", "Lovelace"), make_user("Ben", "Brown"), make_user("Cy", "Chukwu")
+        models.send_friend_request(ben, ada)
+        models.send_friend_request(cy, ada)
+        client = client_for(ada)
+        assert 'form="bulk-received"' in client.get("/friend_requests").get_data(as_text=True)
+
+        response = client.post("/friend_requests/bulk", data={'action': 'accept', 'request_ids': pending_ids(ada)},
+                               follow_redirects=True)
+        assert "2 friend requests accepted." in response.get_data(as_text=True)
+        assert models.are_friends(ada, ben) and models.are_friends(ada, cy)
+
+        response = client.post("/friend_requests/bulk", data={'action': 'drop', 'request_ids': ['1']},
+                               follow_redirects=True)
+        assert "Select at least one request." in response.get_data(as_text=True)
+
+
+def main():
+    print("🧪 Testing Friend Requests")
+    print("=" * 40)
+    tests = [
+        test_send_is_a_single_insert,
+        test_bulk_accept_only_touches_the_receivers_requests,
+        test_bulk_reject_and_cancel,
+        test_bulk_route,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory friend graph behind "People you may know" and
+mutual-friend counts (uses a temporary SQLite database)
+"""
+import threading
+import time
+
+from website import models
+from website.graph import FriendGraph, friend_graph, intersect_sorted
+from test_sqlite_backend import make_user, sqlite_database
+from test_conditional_get import client_for
+
+
+def befriend(a, b):
+    models.send_friend_request(a, b)
+    request_id = [r['id'] for r in models.get_pending_friend_requests(b) if r['sender_id'] == a][0]
+    models.accept_friend_requests(b, [request_id])
+
+
+def test_edges_stay_sorted_and_unique():
+    """Adding edges keeps each friend list sorted, both ways, without duplicates"""
+    graph = FriendGraph()
+    for a, b in [(1, 5), (1, 3), (4, 1), (3, 1)]:
+        graph.add_edge(a, b)
+    assert list(graph.friends(1)) == [3, 4, 5]
+    assert list(graph.friends(3)) == [1] and list(graph.friends(9)) == []
+    assert graph.edge_count() == 6
+
+
+def test_suggestions_rank_by_mutual_friends():
+    """Friends of friends come back by mutual count, never self or friends"""
+    graph = FriendGraph()
+    for a, b in [(1, 2), (1, 3), (2, 4), (3, 4), (2, 5), (3, 1)]:
+        graph.add_edge(a, b)
+    assert graph.suggestions(1) == [(4, 2), (5, 1)]
+    assert graph.suggestions(1, limit=1) == [(4, 2)]
+    assert graph.suggestions(1, exclude=[4]) == [(5, 1)]
+    # A budget smaller than the first friend list walks nobody
+    assert graph.suggestions(1, budget=1) == []
+
+
+def test_intersect_sorted():
+    """Sorted intersection works whichever side is longer"""
+    from array import array
+    small, large = array('i', [3, 50, 999]), array('i', range(0, 1000, 3))
+    assert intersect_sorted(small, large) == intersect_sorted(large, small) == (3, 999)
+    assert intersect_sorted(array('i'), large) == ()
+
+
+def test_mutual_friends_are_cached_until_an_edge_changes():
+    """Cached intersections are reused, and dropped when either list changes"""
+    graph = FriendGraph()
+    for a, b in [(1, 3), (2, 3), (1, 4)]:
+        graph.add_edge(a, b)
+    assert graph.mutual_friends(1, [2, 1]) == {2: (3,), 1: ()}
+    assert graph.mutual_friends(2, [1]) == {1: (3,)}
+    hits = graph._mutual_cache.hits
+    graph.mutual_friends(1, [2])
+    assert graph._mutual_cache.hits == hits + 1
+
+    graph.add_edge(2, 4)
+    assert graph.mutual_friends(1, [2]) == {2: (3, 4)}
+
+
+def test_intersections_from_before_a_reload_are_not_reused():
+    """A result stored under a pre-reload stamp never matches once generations count back up"""
+    with sqlite_database():
+        ada, ben, cy = (make_user(*name) for name in [("Ada", "Lovelace"), ("Ben", "Brown"), ("Cy", "Chukwu")])
+        graph = FriendGraph()
+        graph.add_edge(ada, cy)
+        graph.add_edge(ben, cy)
+        key = (min(ada, ben), max(ada, ben))
+        stale = (graph._loads, graph._generation[key[0]], graph._generation[key[1]])
+
+        # The database has no friendships, so the reload empties the graph;
+        # a reader that took its stamp before the swap then stores its result
+        graph.load()
+        graph._mutual_cache.set(key, (stale, (cy,)))
+        graph._generation.update({key[0]: stale[1], key[1]: stale[2]})
+        assert graph.mutual_friends(ada, [ben]) == {ben: ()}
+
+
+def test_graph_follows_the_database():
+    """Accepting a request updates the graph; other workers' rows arrive on refresh"""
+    with sqlite_database():
+        ada, ben, cy, dee = (make_user(*name) for name in
+                             [("Ada", "Lovelace"), ("Ben", "Brown"), ("Cy", "Chukwu"), ("Dee", "Diaz")])
+        befriend(ada, ben)
+        friend_graph.ensure_current()
+        befriend(ben, cy)
+        assert list(friend_graph.friends(ben)) == [ada, cy]
+
+        other_worker = FriendGraph()
+        other_worker.load()
+        befriend(cy, dee)
+        assert list(other_worker.friends(dee)) == []
+        other_worker.refresh()
+        assert list(other_worker.friends(dee)) == [cy]
+
+
+def test_requests_never_wait_for_a_load():
+    """ensure_current() hands the load to the loader thread and returns straight away"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        befriend(ada, ben)
+        graph = FriendGraph()
+        release = threading.Event()
+        load = graph.load
+
+        def slow_load():
+            release.wait(10)
+            load()
+
+        graph.load = slow_load
+        graph.ensure_current()
+        assert list(graph.friends(ada)) == []
+        release.set()
+        deadline = time.monotonic() + 10
+        while not graph.friends(ada) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert list(graph.friends(ada)) == [ben]
+
+
+def test_concurrent_edges_are_not_lost():
+    """Threads adding friends to the same user all land in the list"""
+    graph = FriendGraph()
+    threads = [threading.Thread(target=lambda start=start: [graph.add_edge(1, f) for f in range(start, 2000, 8)])
+               for start in range(2, 10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert list(graph.friends(1)) == list(range(2, 2000))
+
+
+def test_refresh_catches_rows_committed_out_of_order():
+    """A friendship whose id is below one already seen is still picked up"""
+    with sqlite_database():
+        ada, ben, cy = make_user("Ada", "Lovelace"), make_user("Ben", "Brown"), make_user("Cy", "Chukwu")
+        conn = models.get_db_connection()
+        cursor = conn.cursor()
+
+        def insert_friendship(row_id, a, b):
+            cursor.execute("INSERT INTO friendship (id, user1_id, user2_id, date_created) VALUES (%s, %s, %s, NOW())",
+                           (row_id, a, b))
+            conn.commit()
+
+        graph = FriendGraph()
+        graph.load()
+        insert_friendship(10, ada, ben)
+        graph.refresh()
+        # Allocated before id 10 but committed after it was read
+        insert_friendship(5, ada, cy)
+        graph.refresh()
+        conn.close()
+        assert list(graph.friends(ada)) == [ben, cy]
+
+
+def test_people_you_may_know():
+    """find_people suggests friends of friends, skipping pending requests"""
+    with sqlite_database():
+        ada, ben, cy, dee = (make_user(*name) for name in
+                             [("Ada", "Lovelace"), ("Ben", "Brown"), ("Cy", "Chukwu"), ("Dee", "Diaz")])
+        befriend(ada, ben)
+        befriend(ben, cy)
+        befriend(ben, dee)
+        befriend(ada, cy)
+        befriend(cy, dee)
+
+        suggestions = models.suggest_friends(ada)
+        assert [(u['id'], u['mutual_count']) for u in suggestions] == [(dee, 2)]
+
+        html = client_for(ada).get("/find_people").get_data(as_text=True)
+        assert "People You May Know" in html and "2 mutual friends" in html
+
+        models.send_friend_request(ada, dee)
+        assert models.suggest_friends(ada) == []
+
+
+def test_mutual_friends_on_pages():
+    """Profiles and the directory show mutual counts and names; a new or renamed mutual changes the profile ETag"""
+    with sqlite_database():
+        ada, ben, cy, dee = (make_user(*name) for name in
+                             [("Ada", "Lovelace"), ("Ben", "Brown"), ("Cy", "Chukwu"), ("Dee", "Diaz")])
+        befriend(ada, cy)
+        befriend(ben, cy)
+
+        users = models.attach_mutual_friends(ada, [models.get_user_by_id(ben), models.get_user_by_id(cy)])
+        assert [u['mutual_count'] for u in users] == [1, 0]
+        assert [f['first_name'] for f in users[0]['mutual_friends']] == ["Cy"]
+
+        client = client_for(ada)
+        assert "1 mutual friend" in client.get("/find_people").get_data(as_text=True)
+        response = client.get(f"/profile/{ben}")
+        assert "1 mutual friend:" in response.get_data(as_text=True)
+
+        etag, _ = response.get_etag()
+        befriend(ada, dee)
+        befriend(ben, dee)
+        response = client.get(f"/profile/{ben}", headers={'If-None-Match': f'"{etag}"'})
+        assert response.status_code == 200 and "2 mutual friends:" in response.get_data(as_text=True)
+
+        etag, _ = response.get_etag()
+        models.update_user(cy, {"first_name": "Cyrus"})
+        response = client.get(f"/profile/{ben}", headers={'If-None-Match': f'"{etag}"'})
+        assert response.status_code == 200 and "Cyrus" in response.get_data(as_text=True)
+
+
+def main():
+    print("🧪 Testing Friend Graph")
+    print("=" * 40)
+    tests = [
+        test_edges_stay_sorted_and_unique,
+        test_suggestions_rank_by_mutual_friends,
+        test_intersect_sorted,
+        test_mutual_friends_are_cached_until_an_edge_changes,
+        test_intersections_from_before_a_reload_are_not_reused,
+        test_graph_follows_the_database,
+        test_requests_never_wait_for_a_load,
+        test_concurrent_edges_are_not_lost,
+        test_refresh_catches_rows_committed_out_of_order,
+        test_people_you_may_know,
+        test_mutual_friends_on_pages,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Tests for the media store: content-addressed uploads with reference counts,
+resized variants and immutable serving (uses a temporary media root and SQLite)
+"""
+import contextlib
+import io
+import os
+import tempfile
+
+from werkzeug.datastructures import FileStorage
+
+from website import media, models
+from test_sqlite_backend import make_user, sqlite_database
+
+
+@contextlib.contextmanager
+def media_root():
+    previous = media.MEDIA_ROOT
+    with tempfile.TemporaryDirectory() as directory:
+        media.MEDIA_ROOT = directory
+        try:
+            yield directory
+        finally:
+            media.MEDIA_ROOT = previous
+
+
+def png_upload(filename="photo.png", size=(1600, 1200), color=(200, 80, 40)):
+    from PIL import Image
+    data = io.BytesIO()
+    Image.new("RGB", size, color).save(data, "PNG")
+    data.seek(0)
+    return FileStorage(stream=data, filename=filename)
+
+
+def refcount(key):
+    conn = models.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT refcount FROM media_object WHERE media_key=%s", (key,))
+    row = cursor.fetchone()
+    conn.close()
+    return row['refcount'] if row else 0
+
+
+def test_uploads_are_content_addressed():
+    """Identical uploads share one file and count their references"""
+    with sqlite_database(), media_root() as directory:
+        first = media.save_upload(FileStorage(stream=io.BytesIO(b"same bytes"), filename="a.PNG"))
+        second = media.save_upload(FileStorage(stream=io.BytesIO(b"same bytes"), filename="b.png"))
+        assert first == second and first.endswith(".png") and first[:2] == first[3:5]
+        assert os.path.getsize(os.path.join(directory, first)) == len(b"same bytes")
+        assert refcount(first) == 2
+
+
+def test_save_upload_enforces_the_cap():
+    """An upload over the cap is rejected and leaves no file behind"""
+    with media_root() as directory:
+        upload = FileStorage(stream=io.BytesIO(b"x" * (media.CHUNK_SIZE * 3)), filename="big.png")
+        try:
+            media.save_upload(upload, max_bytes=media.CHUNK_SIZE)
+            assert False, "expected UploadTooLarge"
+        except media.UploadTooLarge:
+            pass
+        assert os.listdir(directory) == []
+
+
+def test_failed_move_gives_the_reference_back():
+    """An upload whose file can't be moved into place keeps no reference"""
+    with sqlite_database(), media_root():
+        replace = os.replace
+
+        def disk_full(src, dst):
+            raise OSError(28, "No space left on device")
+
+        os.replace = disk_full
+        try:
+            media.save_upload(FileStorage(stream=io.BytesIO(b"lost bytes"), filename="a.png"))
+            assert False, "expected OSError"
+        except OSError:
+            pass
+        finally:
+            os.replace = replace
+        conn = models.get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS count FROM media_object")
+        assert cursor.fetchone()['count'] == 0
+        conn.close()
+
+
+def test_variants_are_resized_webp():
+    """Each variant fits its box; avatars are cropped square"""
+    if media.Image is None:
+        return
+    from PIL import Image
+    with sqlite_database(), media_root():
+        key = media.save_upload(png_upload())
+        made = media.make_variants(media.POST_FOLDER, key, media.POST_VARIANTS)
+        with Image.open(media.media_path(None, made["card"])) as card:
+            assert card.format == "WEBP" and card.size == (720, 540)
+        with Image.open(media.media_path(None, made["thumb"])) as thumb:
+            assert thumb.size == (320, 240)
+
+        avatar = media.save_upload(png_upload("me.png", color=(0, 0, 0)))
+        made = media.make_variants(media.AVATAR_FOLDER, avatar, media.AVATAR_VARIANTS)
+        with Image.open(media.media_path(None, made["avatar"])) as thumb:
+            assert thumb.size == (160, 160)
+
+
+def test_post_and_avatar_variants_do_not_collide():
+    """One photo used as a post image and an avatar gets both its post thumb and its square crop"""
+    if media.Image is None:
+        return
+    from PIL import Image
+    with sqlite_database(), media_root() as directory:
+        ada = make_user("Ada", "Lovelace")
+        key = media.save_upload(png_upload())
+        post_id = models.create_post_with_image("Sunset", "Look at this", ada, key)
+        media.build_post_variants(post_id, key)
+        models.set_profile_picture(ada, media.save_upload(png_upload()))
+        media.build_avatar_variants(ada, key)
+
+        avatar_thumb = models.get_user_by_id(ada)['profile_picture_thumb']
+        assert avatar_thumb != models.get_post_by_id(post_id)['image_thumb']
+        with Image.open(media.media_path(None, avatar_thumb)) as thumb:
+            assert thumb.size == (160, 160)
+
+        media.remove_media_files(key)
+        assert not any(files for _, _, files in os.walk(directory))
+
+
+def test_background_processing_records_variants():
+    """The worker pool records the variants on the post and bumps its version"""
+    if media.Image is None:
+        return
+    with sqlite_database(), media_root():
+        ada = make_user("Ada", "Lovelace")
+        key = media.save_upload(png_upload())
+        post_id = models.create_post_with_image("Sunset", "Look at this", ada, key)
+
+        media.process_post_image(post_id, key).result(timeout=30)
+        post = models.get_post_by_id(post_id)
+        assert post['image_card'].endswith(".card.webp") and post['image_thumb'].endswith(".thumb.webp")
+        assert post['version'] == 2
+        assert models.get_posts_without_variants() == []
+
+
+def test_files_go_with_their_last_reference():
+    """Deleting posts and replacing avatars releases files only when unused"""
+    with sqlite_database(), media_root() as directory:
+        ada = make_user("Ada", "Lovelace")
+        key = media.save_upload(png_upload())
+        first = models.create_post_with_image("One", "First", ada, key)
+        media.build_post_variants(first, key)
+        key = media.save_upload(png_upload())
+        second = models.create_post_with_image("Two", "Second", ada, key)
+
+        models.delete_post(first)
+        assert refcount(key) == 1 and os.path.exists(os.path.join(directory, key))
+        models.delete_post(second)
+        assert refcount(key) == 0
+        assert not any(files for _, _, files in os.walk(directory))
+
+        avatar = media.save_upload(png_upload("me.png"))
+        models.set_profile_picture(ada, avatar)
+        models.set_profile_picture(ada, media.save_upload(png_upload("me.png")))
+        assert refcount(avatar) == 1
+        models.set_profile_picture(ada, "default_profile_photo.jpg")
+        assert refcount(avatar) == 0 and not os.path.exists(os.path.join(directory, avatar))
+
+
+def test_media_is_served_immutable():
+    """Stored files get far-future immutable caching and a strong ETag"""
+    from website import create_app
+    from website.views import MEDIA_MAX_AGE
+    with sqlite_database(), media_root():
+        key = media.save_upload(FileStorage(stream=io.BytesIO(b"avatar"), filename="me.png"))
+        client = create_app().test_client()
+
+        response = client.get(f"/media/{key}")
+        assert response.status_code == 200 and response.data == b"avatar"
+        assert response.cache_control.immutable and response.cache_control.public
+        assert response.cache_control.max_age == MEDIA_MAX_AGE
+        etag, weak = response.get_etag()
+        assert etag == os.path.basename(key) and not weak
+
+        response = client.get(f"/media/{key}", headers={"If-None-Match": f'"{etag}"'})
+        assert response.status_code == 304
+        assert client.get("/media/00/missing.png").status_code == 404
+
+
+def main():
+    print("🧪 Testing Media Store")
+    print("=" * 40)
+    tests = [
+        test_uploads_are_content_addressed,
+        test_save_upload_enforces_the_cap,
+        test_failed_move_gives_the_reference_back,
+        test_variants_are_resized_webp,
+        test_post_and_avatar_variants_do_not_collide,
+        test_background_processing_records_variants,
+        test_files_go_with_their_last_reference,
+        test_media_is_served_immutable,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
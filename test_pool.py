@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for the database connection pool (uses in-memory SQLite connections,
+so no MySQL server is needed)
+"""
+import sqlite3
+import threading
+import time
+
+from website.pool import ConnectionPool, PoolExhausted
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        opened.append(conn)
+        return conn
+
+    return ConnectionPool(connect, **kwargs), opened
+
+
+def test_connections_are_reused():
+    """A released connection is handed out again instead of opening a new one"""
+    pool, opened = make_pool(size=2)
+    first = pool.acquire()
+    first.close()
+    second = pool.acquire()
+    assert second._conn is first._conn
+    assert len(opened) == 1
+    second.close()
+
+
+def test_pool_is_bounded():
+    """No more than `size` connections can be checked out at once"""
+    pool, _ = make_pool(size=1, timeout=0.05)
+    held = pool.acquire()
+    try:
+        pool.acquire()
+        assert False, "expected PoolExhausted"
+    except PoolExhausted:
+        pass
+    held.close()
+    pool.acquire().close()
+
+
+def test_request_scoped_close_is_noop():
+    """close() on a request-scoped connection keeps it checked out"""
+    pool, _ = make_pool(size=1, timeout=0.05)
+    conn = pool.acquire()
+    conn.request_scoped = True
+    conn.close()
+    try:
+        pool.acquire()
+        assert False, "connection should still be checked out"
+    except PoolExhausted:
+        pass
+    conn.release()
+    pool.acquire().close()
+
+
+def test_recycle_and_pre_ping():
+    """Stale or dead idle connections are replaced"""
+    pool, opened = make_pool(size=1, recycle=0.01)
+    pool.acquire().close()
+    time.sleep(0.02)
+    pool.acquire().close()
+    assert len(opened) == 2
+
+    pool, opened = make_pool(size=1)
+    conn = pool.acquire()
+    conn.close()
+    opened[0].close()  # simulate the server dropping the connection
+    pool.acquire().close()
+    assert len(opened) == 2
+
+
+def test_thread_safety():
+    """Concurrent borrowers never exceed the pool size"""
+    pool, opened = make_pool(size=3)
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                conn = pool.acquire()
+                conn.cursor().execute("SELECT 1")
+                conn.close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len(opened) <= 3
+
+
+def main():
+    print("🧪 Testing Connection Pool")
+    print("=" * 40)
+    tests = [
+        test_connections_are_reused,
+        test_pool_is_bounded,
+        test_request_scoped_close_is_noop,
+        test_recycle_and_pre_ping,
+        test_thread_safety,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
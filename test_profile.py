@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for profile pages: paginated posts with drafts only for their author,
+and the viewer's relationship read in one query (uses a temporary SQLite database)
+"""
+from website import models
+from test_sqlite_backend import make_user, sqlite_database
+from test_conditional_get import client_for
+
+
+def test_profile_posts_are_paginated():
+    """Pages follow the cursor newest first, and drafts are the author's alone"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        for n in range(7):
+            models.create_post_with_image(f"Post {n}", "Content", ada)
+        models.create_post_with_image("Secret", "Draft", ada, is_draft=True)
+
+        first, cursor = models.get_profile_posts_page(ada, ben, limit=5)
+        second, end = models.get_profile_posts_page(ada, ben, cursor, limit=5)
+        assert [p['title'] for p in first + second] == [f"Post {n}" for n in range(6, -1, -1)]
+        assert end is None
+
+        own, _ = models.get_profile_posts_page(ada, ada, limit=5)
+        assert own[0]['title'] == "Secret"
+
+
+def test_relationship_status():
+    """Friendship and pending requests in both directions"""
+    with sqlite_database():
+        ada, ben, cy = make_user("Ada", "Lovelace"), make_user("Ben", "Brown"), make_user("Cy", "Chukwu")
+        models.send_friend_request(ada, ben)
+        assert models.get_relationship_status(ada, ben) == \
+            {'is_friend': False, 'has_pending_request': False, 'has_sent_request': True}
+        assert models.get_relationship_status(ben, ada)['has_pending_request']
+
+        models.accept_friend_requests(ben, [models.get_pending_friend_requests(ben)[0]['id']])
+        assert models.get_relationship_status(ben, ada) == \
+            {'is_friend': True, 'has_pending_request': False, 'has_sent_request': False}
+        assert not any(models.get_relationship_status(ada, cy).values())
+
+
+def test_profile_page():
+    """The profile shows a page of posts with a link to the next"""
+    with sqlite_database():
+        ada, ben = make_user("Ada", "Lovelace"), make_user("Ben", "Brown")
+        for n in range(6):
+            models.create_post_with_image(f"Post {n}", "Content", ada)
+        client = client_for(ben)
+
+        response = client.get(f"/profile/{ada}")
+        html = response.get_data(as_text=True)
+        assert response.status_code == 200 and "More posts" in html and "Post 5" in html and "Post 0" not in html
+        assert "Send Friend Request" in html
+
+        cursor = html.split("cursor=")[1].split('"')[0]
+        html = client.get(f"/profile/{ada}?cursor={cursor}").get_data(as_text=True)
+        assert "Post 0" in html and "More posts" not in html and "Latest posts" in html
+
+
+def main():
+    print("🧪 Testing Profiles")
+    print("=" * 40)
+    tests = [
+        test_profile_posts_are_paginated,
+        test_relationship_status,
+        test_profile_page,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
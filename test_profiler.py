@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-request SQL profiler and the pages' query budgets (uses
+SQLite, no MySQL needed)
+"""
+import sqlite3
+
+from flask import Flask
+
+from website import models
+from website.profiler import (
+    RECENT_REQUESTS, ProfiledCursor, QueryBudgetExceeded, init_profiler, last_request, query_budget
+)
+from test_sqlite_backend import make_user, sqlite_database
+from test_conditional_get import client_for
+
+
+def make_app(strict=False):
+    app = Flask(__name__)
+    app.config['SQL_BUDGET_STRICT'] = strict
+    init_profiler(app)
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+
+    @app.route("/n-plus-one/<int:n>")
+    @query_budget(3)
+    def n_plus_one(n):
+        cursor = ProfiledCursor(conn.cursor())
+        for i in range(n):
+            cursor.execute("SELECT ? + 1", (i,))
+        return "ok"
+
+    return app
+
+
+def test_counts_queries_in_header():
+    """Each request reports its query count and DB time in response headers"""
+    with make_app().test_client() as client:
+        response = client.get("/n-plus-one/2")
+        assert response.headers['X-DB-Queries'] == "2"
+        assert response.headers['Server-Timing'].startswith("db;")
+
+
+def test_repeated_statements_are_flagged():
+    """A statement run many times in one request is recorded as a repeat, under the URL rule"""
+    with make_app().test_client() as client:
+        client.get("/n-plus-one/6?q=secret")
+    entry = RECENT_REQUESTS[0]
+    assert entry['path'] == "/n-plus-one/<int:n>"
+    assert entry['queries'] == 6
+    assert entry['repeated'] == [("SELECT ? + 1", 6)]
+
+
+def test_budget_fails_in_strict_mode():
+    """Going over a route's query budget raises when SQL_BUDGET_STRICT is on"""
+    app = make_app(strict=True)
+    app.testing = True
+    with app.test_client() as client:
+        assert client.get("/n-plus-one/3").status_code == 200
+        try:
+            client.get("/n-plus-one/4")
+            assert False, "expected QueryBudgetExceeded"
+        except QueryBudgetExceeded:
+            pass
+
+
+def test_pages_stay_within_their_budgets():
+    """Home, Find People, a profile and a busy post page fit their query budgets in strict mode"""
+    from main import app
+    with sqlite_database():
+        users = [make_user(f"User{n}", "Budget") for n in range(6)]
+        ada = users[0]
+        for other in users[1:4]:
+            models.send_friend_request(ada, other)
+            models.accept_friend_requests(other, [models.get_pending_friend_requests(other)[0]['id']])
+        # More rows than any budget, so a query per row would show
+        for n in range(12):
+            models.create_post_with_image(f"Post {n}", "Budgeted", users[n % len(users)])
+        post_id = models.get_all_posts()[0]['id']
+        for n, user_id in enumerate(users * 2):
+            models.add_comment(user_id, post_id, f"Comment {n}")
+            models.toggle_reaction(user_id, post_id, "like" if n % 2 else "dislike")
+        for comment in models.get_post_comments(post_id)[:4]:
+            for user_id in users[:4]:
+                models.reply_to_comment(user_id, comment['id'], None, "Reply")
+
+        saved = app.config['SQL_BUDGET_STRICT'], app.testing
+        app.config['SQL_BUDGET_STRICT'], app.testing = True, True
+        try:
+            client = client_for(ada)
+            for url in ["/home/", "/find_people", f"/profile/{users[1]}", f"/post/{post_id}"]:
+                response = client.get(url)
+                response.get_data()
+                response.close()  # streamed pages check their budget here
+                budget = app.view_functions[last_request()['endpoint']].query_budget
+                assert response.status_code == 200, url
+                assert 0 < last_request()['queries'] <= budget, (url, last_request()['queries'])
+        finally:
+            app.config['SQL_BUDGET_STRICT'], app.testing = saved
+
+
+def main():
+    print("🧪 Testing SQL Profiler")
+    print("=" * 40)
+    tests = [
+        test_counts_queries_in_header,
+        test_repeated_statements_are_flagged,
+        test_budget_fails_in_strict_mode,
+        test_pages_stay_within_their_budgets,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
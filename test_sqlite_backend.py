@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Tests for the embedded SQLite backend: the schema migrations and the model
+functions run unchanged against a temporary database file
+"""
+import contextlib
+import os
+import sqlite3
+import tempfile
+
+import website
+from website import models
+from website.backends import SQLiteBackend, translate
+
+
+@contextlib.contextmanager
+def sqlite_database():
+    """Point the app at a fresh, migrated SQLite file for the duration of the block"""
+    previous = website.backend
+    with tempfile.TemporaryDirectory() as directory:
+        website.use_backend(SQLiteBackend(os.path.join(directory, "test.sqlite3")))
+        try:
+            website.create_database()
+            yield
+        finally:
+            website.use_backend(previous)
+
+
+def make_user(first_name, last_name):
+    email = f"{first_name.lower()}@example.com"
+    models.insert_user(first_name, last_name, email, "password123")
+    return models.get_user_by_email(email)['id']
+
+
+def test_translate():
+    """MySQL-only syntax is rewritten for SQLite"""
+    assert translate("INSERT IGNORE INTO t (a) VALUES (%s)") == "INSERT OR IGNORE INTO t (a) VALUES (?)"
+    assert translate("SELECT id FROM post WHERE id=%s FOR UPDATE") == "SELECT id FROM post WHERE id=?"
+    assert translate("MATCH(title, content) AGAINST (%s IN BOOLEAN MODE)") == "FT_MATCH(?, title, content)"
+    assert "INTEGER PRIMARY KEY AUTOINCREMENT" in translate("id INT AUTO_INCREMENT PRIMARY KEY,")
+
+
+def test_migrations_are_idempotent():
+    """The full schema builds on SQLite and a second run applies nothing"""
+    with sqlite_database():
+        from website.migrations import LATEST_VERSION, run_migrations
+        assert website.check_schema_version() == LATEST_VERSION
+        conn = website.get_db_connection()
+        assert run_migrations(conn) == []
+        conn.close()
+
+
+def test_for_update_takes_the_write_lock():
+    """A locking read holds off other writers until its transaction ends"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        ben = make_user("Ben", "Brown")
+        models.send_friend_request(ada, ben)
+        request_id = models.get_pending_friend_requests(ben)[0]['id']
+
+        conn = website.get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT status FROM friend_request WHERE id=%s FOR UPDATE", (request_id,))
+        other = sqlite3.connect(website.backend.path, timeout=0)
+        try:
+            other.execute("UPDATE friend_request SET status='rejected' WHERE id=?", (request_id,))
+            assert False, "expected the database to be locked"
+        except sqlite3.OperationalError as e:
+            assert "locked" in str(e)
+        conn.rollback()
+        conn.close()
+
+        other.execute("UPDATE friend_request SET status='rejected' WHERE id=?", (request_id,))
+        other.commit()
+        other.close()
+
+
+def test_posts_reactions_and_feeds():
+    """Posting, reacting, commenting and the feeds work end to end"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        ben = make_user("Ben", "Brown")
+        models.send_friend_request(ada, ben)
+        request = models.get_pending_friend_requests(ben)[0]
+        models.accept_friend_requests(ben, [request['id']])
+        assert models.are_friends(ada, ben)
+
+        models.create_post_with_image("Hello python world", "Flask on SQLite", ada)
+        models.create_post_with_image("Draft", "Not yet", ada, is_draft=True)
+        post_id = models.get_all_posts()[0]['id']
+
+        assert models.toggle_reaction(ben, post_id, "like") == \
+            {'liked': True, 'disliked': False, 'likes_count': 1, 'dislikes_count': 0}
+        assert models.toggle_reaction(ben, post_id, "dislike") == \
+            {'liked': False, 'disliked': True, 'likes_count': 0, 'dislikes_count': 1}
+
+        models.add_comment(ben, post_id, "Nice")
+        comment_id = models.get_post_comments(post_id)[0]['id']
+        models.reply_to_comment(ada, comment_id, None, "Thanks")
+        comments, _ = models.get_comment_tree(post_id)
+        assert [reply['data'] for reply in comments[0]['replies']] == ["Thanks"]
+        try:
+            models.get_comment_tree(post_id, replies_limit=0)
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+        page = models.stream_feed(ben, friends=True)
+        items = list(page)
+        assert [item['post']['title'] for item in items] == ["Hello python world"]
+        assert items[0]['post']['user_disliked'] and page.next_cursor is None
+        assert models.get_post_comments_count(post_id) == 1
+        assert models.reconcile_post_counters() == 0
+
+        models.delete_post(post_id)
+        assert models.get_post_by_id(post_id) is None
+        assert models.get_post_comments(post_id) == []
+
+
+def test_reaction_counters_match_the_rows():
+    """Repeated and swapped reactions keep the post counters equal to the row counts"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        ben = make_user("Ben", "Brown")
+        cy = make_user("Cy", "Young")
+        post_id = models.create_post_with_image("Hello", "React to me", ada)
+
+        def row_counts():
+            conn = website.get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) AS n FROM `like` WHERE post_id=%s", (post_id,))
+            likes = cursor.fetchone()['n']
+            cursor.execute("SELECT COUNT(*) AS n FROM dislike WHERE post_id=%s", (post_id,))
+            dislikes = cursor.fetchone()['n']
+            conn.close()
+            return likes, dislikes
+
+        toggles = [
+            (ben, "like"), (ben, "like"), (ben, "like"),
+            (cy, "like"), (ben, "dislike"), (cy, "dislike"),
+            (cy, "like"), (ben, "dislike"), (ada, "dislike"), (ada, "like"),
+        ]
+        for user_id, kind in toggles:
+            state = models.toggle_reaction(user_id, post_id, kind)
+            assert (state['likes_count'], state['dislikes_count']) == row_counts()
+        assert row_counts() == (2, 0)
+        assert models.reconcile_post_counters() == 0
+        assert models.toggle_reaction(ben, post_id + 1, "like") is None
+
+
+def test_timeline_fan_out_and_trim():
+    """New posts reach the author's and friends' timelines, trimmed to the newest"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        ben = make_user("Ben", "Brown")
+        cy = make_user("Cy", "Young")
+        models.send_friend_request(ada, ben)
+        models.accept_friend_requests(ben, [models.get_pending_friend_requests(ben)[0]['id']])
+
+        def timeline(user_id):
+            conn = website.get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT post_id FROM timeline WHERE user_id=%s ORDER BY date DESC, post_id DESC",
+                (user_id,)
+            )
+            post_ids = [row['post_id'] for row in cursor.fetchall()]
+            conn.close()
+            return post_ids
+
+        models.create_post_with_image("Hello", "Everyone", ada)
+        models.create_post_with_image("Draft", "Not yet", ada, is_draft=True)
+        hello = models.get_all_posts()[0]['id']
+        assert timeline(ada) == [hello] and timeline(ben) == [hello]
+        assert timeline(cy) == []
+
+        for number in range(4):
+            models.create_post_with_image(f"Post {number}", "More", ada)
+        assert len(timeline(ben)) == 5
+        models.create_post_with_image("Cy's own", "Short timeline", cy)
+
+        assert models.trim_timelines(3) == 4
+        newest = [post['id'] for post in models.get_all_posts() if post['title'].startswith("Post")]
+        newest = sorted(newest, reverse=True)[:3]
+        assert timeline(ada) == newest and timeline(ben) == newest and len(timeline(cy)) == 1
+        assert models.trim_timelines(3) == 0
+
+
+def test_friends_feed_keyset_paging():
+    """Following next_cursor walks the friends feed once, newest first"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        ben = make_user("Ben", "Brown")
+        models.send_friend_request(ada, ben)
+        models.accept_friend_requests(ben, [models.get_pending_friend_requests(ben)[0]['id']])
+        for number in range(7):
+            models.create_post_with_image(f"Post {number}", "Paged", ada)
+
+        titles = []
+        pages = 0
+        cursor = None
+        while True:
+            page = models.stream_feed(ben, cursor, limit=3, friends=True)
+            items = list(page)
+            assert len(items) <= 3
+            titles.extend(item['post']['title'] for item in items)
+            pages += 1
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert pages == 3
+        assert titles == [f"Post {number}" for number in reversed(range(7))]
+
+
+def test_people_directory_keyset_paging():
+    """Following next_cursor visits every other user once by name, duplicate names included"""
+    with sqlite_database():
+        viewer = make_user("Viewer", "Zed")
+        names = [("Sam", "Smith"), ("Sam", "Adams"), ("Sam", "Smith"), ("Ada", "Lovelace"),
+                 ("Sam", "Smith"), ("Ben", "Brown"), ("Sam", "Adams")]
+        expected = []
+        for number, (first, last) in enumerate(names):
+            email = f"user{number}@example.com"
+            models.insert_user(first, last, email, "password123")
+            expected.append((first, last, models.get_user_by_email(email)['id']))
+        expected.sort()
+
+        seen = []
+        pages = 0
+        cursor = None
+        while True:
+            page = models.stream_people_page(viewer, cursor, limit=2)
+            people = list(page)
+            assert len(people) <= 2
+            seen.extend((p['first_name'], p['last_name'], p['id']) for p in people)
+            pages += 1
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert pages == 4
+        assert seen == expected
+
+
+def test_search():
+    """Search matches every word by prefix and skips drafts"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        make_user("Ben", "Brown")
+        models.create_post_with_image("Python tips", "Generators everywhere", ada)
+        models.create_post_with_image("Python secrets", "Draft", ada, is_draft=True)
+
+        assert [u['first_name'] for u in models.search_users("ada love")] == ["Ada"]
+        assert [p['title'] for p in models.search_posts("pyth gen")] == ["Python tips"]
+        assert models.search_posts("python missing") == []
+
+
+def main():
+    print("🧪 Testing SQLite Backend")
+    print("=" * 40)
+    tests = [
+        test_translate,
+        test_migrations_are_idempotent,
+        test_for_update_takes_the_write_lock,
+        test_posts_reactions_and_feeds,
+        test_reaction_counters_match_the_rows,
+        test_timeline_fan_out_and_trim,
+        test_friends_feed_keyset_paging,
+        test_people_directory_keyset_paging,
+        test_search,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for the streamed home, search and Find People pages: rows are read
+while the template renders and the pager is filled in after the loop
+(uses a temporary SQLite database)
+"""
+import base64
+import re
+
+from website import models
+from test_sqlite_backend import make_user, sqlite_database
+from test_conditional_get import client_for
+
+
+def next_link(html, marker):
+    return html.split(marker)[0].rsplit('href="', 1)[1].split('"')[0].replace("&amp;", "&")
+
+
+def test_lazy_page_fills_its_pager_at_the_end():
+    """has_more and next_cursor are only set once the extra row has been read"""
+    page = models.LazyPage(iter([{'id': n} for n in range(4)]), 3, key=lambda row: (row['id'],))
+    rows = iter(page)
+    assert next(rows) == {'id': 0} and page.next_cursor is None
+    assert list(rows) == [{'id': 1}, {'id': 2}]
+    assert page.has_more and models.decode_cursor(page.next_cursor) == [2]
+
+
+def test_streamed_rows_are_closed_before_the_next_query():
+    """Reading a page short of its extra row still closes the cursor, and the connection carries on"""
+    from main import app
+    with sqlite_database(), app.app_context():
+        for n in range(5):
+            make_user(f"U{n}", "Zed")
+        rows = models._stream_rows("SELECT * FROM user ORDER BY id", ())
+        page = models.LazyPage(rows, 2)
+        assert len(list(page)) == 2 and page.has_more
+        assert rows.gi_frame is None  # finished: its finally has run
+        assert [u['first_name'] for u in models.stream_search_users("zed")][:1] == ["U0"]
+
+
+def test_home_streams_and_pages():
+    """The home feed is streamed and its Load more link follows on"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        for n in range(models.FEED_PAGE_SIZE + 2):
+            models.create_post_with_image(f"Post {n}", "Content", ada)
+        client = client_for(ada)
+
+        response = client.get("/home/")
+        assert response.is_streamed and response.get_etag()[0]
+        html = response.get_data(as_text=True)
+        assert html.count('class="feed-item"') == models.FEED_PAGE_SIZE
+
+        html = client.get(next_link(html, "Load more")).get_data(as_text=True)
+        assert html.count('class="feed-item"') == 2 and "Load more" not in html
+
+
+def test_home_cursor_walks_the_feed_once():
+    """Following Load more to the end shows every post once, newest first"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        for n in range(models.FEED_PAGE_SIZE * 2 + 3):
+            models.create_post_with_image(f"Title-{n:03}", "Content", ada)
+        client = client_for(ada)
+
+        titles = []
+        pages = 0
+        url = "/home/"
+        while url:
+            html = client.get(url).get_data(as_text=True)
+            titles.extend(re.findall(r"Title-\d+", html))
+            pages += 1
+            url = next_link(html, "Load more") if "Load more" in html else None
+        assert pages == 3
+        assert titles == [f"Title-{n:03}" for n in reversed(range(models.FEED_PAGE_SIZE * 2 + 3))]
+
+
+def test_home_ignores_a_malformed_cursor():
+    """A garbage cursor gets the first page of the feed, not an error"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        for n in range(3):
+            models.create_post_with_image(f"Title-{n:03}", "Content", ada)
+        client = client_for(ada)
+
+        first = re.findall(r"Title-\d+", client.get("/home/").get_data(as_text=True))
+        for cursor in ["garbage", "%%%", base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+                       base64.urlsafe_b64encode(b'["not a date", "x"]').decode()]:
+            response = client.get("/home/", query_string={'cursor': cursor})
+            assert response.status_code == 200, cursor
+            assert re.findall(r"Title-\d+", response.get_data(as_text=True)) == first
+
+
+def test_streamed_search_pages():
+    """Search reads users and posts lazily and still knows when there is a next page"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        for n in range(models.SEARCH_PAGE_SIZE + 1):
+            models.create_post_with_image(f"Python {n}", "Tips", ada)
+        client = client_for(ada)
+
+        html = client.get("/search/python").get_data(as_text=True)
+        assert "There are no users matching your search." in html and "Next &rarr;" in html
+        html = client.get("/search/python?page=2").get_data(as_text=True)
+        assert html.count("Python ") == 1 and "Next &rarr;" not in html
+
+        response = client.get("/search")
+        assert response.status_code == 200 and "Next &rarr;" not in response.get_data(as_text=True)
+
+
+def test_flash_is_shown_once_on_a_streamed_page():
+    """A flash message rendered into a streamed page is gone on the next request"""
+    with sqlite_database():
+        ada = make_user("Ada", "Lovelace")
+        client = client_for(ada)
+        with client.session_transaction() as session:
+            session['_flashes'] = [('success', 'Friend request sent successfully!')]
+
+        assert "Friend request sent successfully!" in client.get("/find_people").get_data(as_text=True)
+        html = client.get("/find_people").get_data(as_text=True)
+        assert "Friend request sent successfully!" not in html and "No other users found" in html
+
+
+def main():
+    print("🧪 Testing Streamed Pages")
+    print("=" * 40)
+    tests = [
+        test_lazy_page_fills_its_pager_at_the_end,
+        test_streamed_rows_are_closed_before_the_next_query,
+        test_home_streams_and_pages,
+        test_home_cursor_walks_the_feed_once,
+        test_home_ignores_a_malformed_cursor,
+        test_streamed_search_pages,
+        test_flash_is_shown_once_on_a_streamed_page,
+    ]
+    for test in tests:
+        test()
+        print(f"✅ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
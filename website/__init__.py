@@ -1,6 +1,13 @@
-from flask import Flask, g, redirect, url_for
+import os
+import time
+
+import click
+from flask import Flask, g, has_app_context, redirect, url_for
 from flask_login import LoginManager, current_user
-import pymysql
+
+from .backends import MySQLBackend, SQLiteBackend
+from .pool import ConnectionPool
+from .profiler import ProfiledCursor, init_profiler
 
 # 🧩 MySQL Configuration
 DB_USER = "root"
@@ -8,36 +15,98 @@ DB_PASSWORD = ""
 DB_HOST = "localhost"
 DB_NAME = "socialmedia_application"
 
+# Storage backend: "mysql" (default) or "sqlite" for an embedded database file
+DB_BACKEND = os.environ.get("DB_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get(
+    "SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", f"{DB_NAME}.sqlite3")
+)
+
+# Connection pool sizing (per worker process)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 3600))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+
 # ------------------------------
 # Database helper
 # ------------------------------
-def get_db_connection():
-    return pymysql.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
+def make_backend(name=DB_BACKEND):
+    if name == "sqlite":
+        return SQLiteBackend(SQLITE_PATH)
+    if name == "mysql":
+        return MySQLBackend(DB_HOST, DB_USER, DB_PASSWORD, DB_NAME)
+    raise ValueError(f"Unknown DB_BACKEND {name!r} (expected 'mysql' or 'sqlite')")
+
+
+def _make_pool(backend):
+    return ConnectionPool(
+        backend.connect,
+        size=DB_POOL_SIZE,
+        recycle=DB_POOL_RECYCLE,
+        timeout=DB_POOL_TIMEOUT,
+        wrap_cursor=ProfiledCursor
     )
 
+
+backend = make_backend()
+pool = _make_pool(backend)
+
+
+def use_backend(new_backend):
+    """Point every later connection at `new_backend` (e.g. a SQLite file in tests)."""
+    global backend, pool
+    old_pool = pool
+    backend, pool = new_backend, _make_pool(new_backend)
+    old_pool.close_idle()
+    # The in-memory friend graph and caches mirror the old database, whose ids
+    # the new one will reuse; load afresh on next use
+    from .cache import fragment_cache, user_cache
+    from .graph import friend_graph
+    friend_graph.reset()
+    user_cache.clear()
+    fragment_cache.clear()
+
+
+def get_db_connection():
+    """Borrow a connection from the pool.
+
+    Inside an app/request context every caller shares one connection, checked
+    out on first use and returned when the context is torn down, so a model
+    function's conn.close() is a no-op there. Outside a context the caller owns
+    the connection and close() returns it to the pool.
+    """
+    if not has_app_context():
+        return pool.acquire()
+    if 'db' not in g:
+        g.db = pool.acquire()
+        g.db.request_scoped = True
+    return g.db
+
 # ------------------------------
 # Flask App Factory
 # ------------------------------
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'asdfaskjdfgahet'
+    # Requests running more queries than this are logged (SQL_BUDGET_STRICT makes them fail)
+    app.config['SQL_QUERY_BUDGET'] = int(os.environ.get("SQL_QUERY_BUDGET", 25))
+    init_profiler(app)
+
+    # Reject oversized uploads before they are read (a little headroom for the other form fields)
+    from .media import MAX_UPLOAD_BYTES, image_url
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+    app.jinja_env.globals['image_url'] = image_url
 
-    # Manage per-request database connection
-    @app.before_request
-    def before_request():
-        g.db = get_db_connection()
-        g.cursor = g.db.cursor()
+    # Part of every page ETag, so deploying new code or templates changes them all
+    app.config['ETAG_SALT'] = os.environ.get("ETAG_SALT") or _source_stamp()
 
-    @app.teardown_request
-    def teardown_request(exception=None):
-        db = getattr(g, 'db', None)
+    # Return the request's pooled connection (if one was borrowed) when it ends
+    @app.teardown_appcontext
+    def release_db_connection(exception=None):
+        db = g.pop('db', None)
         if db is not None:
-            db.close()
+            db.release()
 
     # ------------------------------
     # Import blueprints
@@ -56,13 +125,63 @@ def create_app():
     login_manager.init_app(app)
 
     from .auth import DBUser, get_user_by_id
+    from .cache import user_cache
 
     @login_manager.user_loader
     def load_user(user_id):
-        user_dict = get_user_by_id(user_id)
-        if user_dict:
-            return DBUser(user_dict)
-        return None
+        user = user_cache.get(int(user_id))
+        if user is None:
+            user_dict = get_user_by_id(user_id)
+            if not user_dict:
+                return None
+            user = DBUser(user_dict)
+            user_cache.set(user.id, user)
+        return user
+
+    # ------------------------------
+    # Maintenance commands
+    # ------------------------------
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create the database and apply any pending schema migrations."""
+        try:
+            create_database()
+        except Exception as e:
+            raise click.ClickException(f"Error creating database or tables: {e}")
+
+    @app.cli.command("reconcile-counters")
+    @click.option("--batch-size", default=1000, show_default=True, help="Posts per transaction.")
+    def reconcile_counters_command(batch_size):
+        """Recompute post like/dislike/comment counters to repair drift."""
+        from .models import reconcile_post_counters
+        repaired = reconcile_post_counters(batch_size)
+        click.echo(f"✅ Repaired counters on {repaired} posts.")
+
+    @app.cli.command("trim-timelines")
+    def trim_timelines_command():
+        """Cut friends-feed timelines back to their newest TIMELINE_MAX_LENGTH entries."""
+        from .models import trim_timelines
+        removed = trim_timelines()
+        click.echo(f"✅ Removed {removed} old timeline entries.")
+
+    @app.cli.command("fragment-cache-server")
+    @click.option("--host", default="127.0.0.1", show_default=True)
+    @click.option("--port", default=50000, show_default=True)
+    def fragment_cache_server_command(host, port):
+        """Run a shared post-fragment store for workers (set FRAGMENT_CACHE_ADDRESS)."""
+        from .cache import serve_shared_store, shared_store_authkey
+        authkey = shared_store_authkey()
+        if not authkey:
+            raise click.ClickException("Set FRAGMENT_CACHE_AUTHKEY to a secret shared with the workers.")
+        click.echo(f"✅ Serving shared fragment cache on {host}:{port}")
+        serve_shared_store((host, port), authkey)
+
+    @app.cli.command("build-thumbnails")
+    def build_thumbnails_command():
+        """Generate resized variants for images uploaded before they existed."""
+        from .media import backfill_variants
+        posts, users = backfill_variants()
+        click.echo(f"✅ Built variants for {posts} post images and {users} profile pictures.")
 
     # ------------------------------
     # Simple test route
@@ -78,149 +197,63 @@ def create_app():
     def not_found(e):
         return "Page not found", 404
 
+    @app.errorhandler(413)
+    def too_large(e):
+        return "Upload too large", 413
+
     # ------------------------------
-    # Ensure DB exists
+    # Check the schema (no DDL here; run `flask init-db` to migrate)
     # ------------------------------
-    create_database()
+    check_schema_version()
 
-    print("✅ Flask app initialized and connected to MySQL.")
+    app.config['STARTUP_SECONDS'] = time.perf_counter() - started
+    print(f"✅ Flask app initialized in {app.config['STARTUP_SECONDS'] * 1000:.1f} ms.")
     return app
 
 
+def _source_stamp():
+    """Newest modification time among the package's modules and templates."""
+    package = os.path.dirname(os.path.abspath(__file__))
+    paths = [os.path.join(package, name) for name in os.listdir(package) if name.endswith(".py")]
+    templates = os.path.join(package, "templates")
+    paths += [os.path.join(templates, name) for name in os.listdir(templates)]
+    return str(max(os.path.getmtime(path) for path in paths))
+
+
 # ------------------------------
 # Create DB & Tables if missing
 # ------------------------------
-def create_database():
-    try:
-        conn = pymysql.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        cursor = conn.cursor()
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{DB_NAME}`")
-        conn.commit()
-        conn.close()
+def check_schema_version():
+    """Warn (without touching the schema) if the database lags behind the code.
 
+    Costs a single query, so it is cheap enough to run in every worker.
+    """
+    from .migrations import LATEST_VERSION
+    try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            email VARCHAR(150) UNIQUE NOT NULL,
-            password VARCHAR(150) NOT NULL,
-            first_name VARCHAR(150),
-            last_name VARCHAR(150),
-            profile_picture VARCHAR(1000),
-            bio VARCHAR(1500),
-            links VARCHAR(500),
-            date_joined DATETIME
-        )
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS post (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            title VARCHAR(100),
-            content VARCHAR(5000),
-            image VARCHAR(1000),
-            category VARCHAR(100),
-            drafts boolean default false,
-            tags VARCHAR(500),
-            date DATETIME,
-            user_id INT,
-            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
-        )
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS `like` (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT,
-            post_id INT,
-            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
-            FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
-        )
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS dislike (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT,
-            post_id INT,
-            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
-            FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
-        )
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS comment (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT,
-            post_id INT,
-            data VARCHAR(1000),
-            date DATETIME,
-            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
-            FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
-        )
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reply_comment (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT,
-            comment_id INT,
-            post_id INT,
-            data VARCHAR(1000),
-            date DATETIME,
-            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
-            FOREIGN KEY (comment_id) REFERENCES comment(id) ON DELETE CASCADE,
-            FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
-        )
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS comment_like (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT,
-            post_id INT,
-            comment_id INT,
-            FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
-            FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE,
-            FOREIGN KEY (comment_id) REFERENCES comment(id) ON DELETE CASCADE
-        )
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS friend_request (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            sender_id INT,
-            receiver_id INT,
-            status ENUM('pending', 'accepted', 'rejected') DEFAULT 'pending',
-            date_sent DATETIME,
-            date_responded DATETIME,
-            FOREIGN KEY (sender_id) REFERENCES user(id) ON DELETE CASCADE,
-            FOREIGN KEY (receiver_id) REFERENCES user(id) ON DELETE CASCADE,
-            UNIQUE KEY unique_request (sender_id, receiver_id)
-        )
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS friendship (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user1_id INT,
-            user2_id INT,
-            date_created DATETIME,
-            FOREIGN KEY (user1_id) REFERENCES user(id) ON DELETE CASCADE,
-            FOREIGN KEY (user2_id) REFERENCES user(id) ON DELETE CASCADE,
-            UNIQUE KEY unique_friendship (user1_id, user2_id)
-        )
-        """)
-
-        conn.commit()
-        conn.close()
-        print("✅ All tables created successfully in MySQL.")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+            version = cursor.fetchone()['version']
+        finally:
+            conn.close()
     except Exception as e:
-        print("❌ Error creating database or tables:", e)
+        print(f"⚠️  Could not read the schema version ({e}). Run `flask --app main init-db`.")
+        return None
+    if version < LATEST_VERSION:
+        print(f"⚠️  Database schema is at version {version}, code expects {LATEST_VERSION}. "
+              "Run `flask --app main init-db`.")
+    return version
+
+
+def create_database():
+    """Create the database if needed and apply pending migrations (see `flask init-db`)."""
+    backend.create_database()
+
+    from .migrations import run_migrations
+    conn = get_db_connection()
+    applied = run_migrations(conn)
+    conn.close()
+    if applied:
+        print(f"✅ Applied schema migrations: {', '.join(map(str, applied))}")
+    print("✅ Database schema is up to date.")
@@ -18,6 +18,7 @@ class DBUser(UserMixin):
         self.last_name = user_dict["last_name"]
         self.profile_picture = user_dict.get("profile_picture", "default_profile_photo.jpg")
         self.bio = user_dict.get("bio", "")
+        self.version = user_dict.get("version", 1)
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -0,0 +1,206 @@
+"""
+Storage backends.
+
+The models speak MySQL-flavoured SQL through DB-API connections that return
+rows as dicts. MySQLBackend hands out PyMySQL connections as they are;
+SQLiteBackend runs the same statements against an embedded database file,
+translating the few MySQL-only constructs on the way in, so single-node
+deployments and CI don't pay a network round trip per query.
+
+Pick one with DB_BACKEND=mysql|sqlite (see website/__init__.py).
+"""
+import os
+import re
+import sqlite3
+from datetime import datetime
+from functools import lru_cache
+
+import pymysql
+
+
+# ------------------------------
+# MySQL
+# ------------------------------
+class MySQLBackend:
+    name = "mysql"
+    # Unbuffered: rows are read off the socket as they are iterated
+    streaming_cursor = pymysql.cursors.SSDictCursor
+
+    def __init__(self, host, user, password, database):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+
+    def connect(self):
+        return pymysql.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            cursorclass=pymysql.cursors.DictCursor
+        )
+
+    def create_database(self):
+        conn = pymysql.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            cursorclass=pymysql.cursors.DictCursor
+        )
+        cursor = conn.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{self.database}`")
+        conn.commit()
+        conn.close()
+
+
+# ------------------------------
+# SQLite
+# ------------------------------
+# SQLite has no row locks; a locking read takes the database's write lock
+# instead (see SQLiteCursor.execute) and the clause itself is dropped
+_FOR_UPDATE = re.compile(r"\s+FOR UPDATE\b", re.I)
+
+# Statement rewrites applied before a query reaches SQLite. Functions with the
+# same meaning in both dialects (NOW, GREATEST, GET_LOCK...) are registered on
+# each connection instead, see _register_functions().
+_REWRITES = [
+    (re.compile(r"\bINT AUTO_INCREMENT PRIMARY KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bENUM\([^)]*\)", re.I), "TEXT"),
+    (re.compile(r"\bUNIQUE KEY \w+ \(", re.I), "UNIQUE ("),
+    (re.compile(r"\bINSERT IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (_FOR_UPDATE, ""),
+    # No FULLTEXT indexes here: boolean-mode matches become a scan through FT_MATCH()
+    (re.compile(r"\bMATCH\(([^)]*)\)\s*AGAINST\s*\(\s*%s\s+IN BOOLEAN MODE\s*\)", re.I), r"FT_MATCH(%s, \1)"),
+    (re.compile(r"%s"), "?"),
+]
+
+
+@lru_cache(maxsize=512)
+def translate(sql):
+    """Rewrite one MySQL statement into SQLite's dialect."""
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _now():
+    return datetime.now().isoformat(" ", "seconds")
+
+
+def _greatest(*values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+_WORD = re.compile(r"\w+")
+
+
+def _ft_match(terms, *columns):
+    """Relevance of `columns` for a boolean-mode query of `+word*` terms (0 if any is missing)."""
+    words = _WORD.findall(" ".join(c for c in columns if c).lower())
+    score = 0
+    for term in (terms or "").lower().split():
+        prefix = term.strip("+*")
+        hits = sum(1 for w in words if w.startswith(prefix)) if term.endswith("*") else words.count(prefix)
+        if not hits:
+            return 0
+        score += hits
+    return score
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _register_functions(conn):
+    conn.create_function("NOW", 0, _now)
+    conn.create_function("GREATEST", -1, _greatest, deterministic=True)
+    conn.create_function("FT_MATCH", -1, _ft_match, deterministic=True)
+    # A single file has a single writer anyway; migrations need no extra lock
+    conn.create_function("GET_LOCK", 2, lambda name, timeout: 1)
+    conn.create_function("RELEASE_LOCK", 1, lambda name: 1)
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" ", "seconds"))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteCursor:
+    """DB-API cursor that accepts the models' MySQL statements and returns dict rows."""
+
+    dialect = "sqlite"
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, args=None):
+        if _FOR_UPDATE.search(sql):
+            # sqlite3 opens no transaction before a SELECT, so without this the
+            # read-then-write steps behind FOR UPDATE would run unlocked
+            self._connection.begin(immediate=True)
+        self._cursor.execute(translate(sql), args if args is not None else ())
+        return self._cursor.rowcount
+
+    def executemany(self, sql, args):
+        self._cursor.executemany(translate(sql), args)
+        return self._cursor.rowcount
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return SQLiteCursor(self._conn.cursor(), self)
+
+    def begin(self, immediate=False):
+        """Open a transaction unless one is already open; `immediate` takes the write lock now."""
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+
+class SQLiteBackend:
+    """Embedded database in a single file, opened in WAL mode with memory-mapped reads.
+
+    WAL lets readers carry on while one writer commits; writers queue on the
+    file lock for up to `busy_timeout` seconds.
+    """
+
+    name = "sqlite"
+    # sqlite3 cursors already step through results one row at a time
+    streaming_cursor = None
+
+    def __init__(self, path, mmap_size=256 * 1024 * 1024, busy_timeout=5):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+        conn.row_factory = _dict_row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        _register_functions(conn)
+        return SQLiteConnection(conn)
+
+    def create_database(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
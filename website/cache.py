@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager, BaseProxy
+
+from markupsafe import Markup
+
+
+class TTLCache:
+    """A small thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Keeps hit/miss counters so its effectiveness can be checked at runtime.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Logged-in users, keyed by id, as loaded by Flask-Login on every request.
+# Each worker process has its own copy: update_user() invalidates the local
+# entry immediately and the TTL bounds how long other workers can lag behind.
+user_cache = TTLCache(
+    maxsize=int(os.environ.get("USER_CACHE_SIZE", 4096)),
+    ttl=int(os.environ.get("USER_CACHE_TTL", 60))
+)
+
+
+# ------------------------------
+# Rendered fragment cache
+# ------------------------------
+class SharedBackend:
+    """Fragment storage shared between worker processes.
+
+    Wraps anything with get(key, default) and set(key, value), e.g. the proxy
+    returned by connect_shared_store() below or an adapter over memcached.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def get(self, key, default=None):
+        try:
+            return self._store.get(key, default)
+        except (OSError, EOFError):
+            return default  # the shared store is down; fall back to rendering
+
+    def set(self, key, value):
+        try:
+            self._store.set(key, value)
+        except (OSError, EOFError):
+            pass
+
+
+class FragmentCache:
+    """Caches rendered HTML fragments by key.
+
+    Keys carry version stamps (e.g. "home:42:v7:u3:v2"), so an edit never has
+    to delete anything: the next render simply asks for a new key and old
+    entries age out of the backend. The backend is any object with
+    get(key, default) and set(key, value), in-process (TTLCache) by default.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render):
+        html = self.backend.get(key)
+        if html is None:
+            self.misses += 1
+            html = str(render())
+            self.backend.set(key, html)
+        else:
+            self.hits += 1
+        return Markup(html)
+
+    def clear(self):
+        """Drop every local entry; a shared backend is left to the other workers."""
+        clear = getattr(self.backend, "clear", None)
+        if clear is not None:
+            clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class _StoreManager(BaseManager):
+    pass
+
+
+class _StoreProxy(BaseProxy):
+    _exposed_ = ("get", "set")
+
+    def get(self, key, default=None):
+        return self._callmethod("get", (key, default))
+
+    def set(self, key, value):
+        return self._callmethod("set", (key, value))
+
+
+# The manager protocol exchanges pickles, so anyone who can connect with the
+# authkey can run code in the store and in every worker. There is no default
+# key: without FRAGMENT_CACHE_AUTHKEY the store won't start and workers keep
+# a local cache. Keep the store on 127.0.0.1 or a private network regardless.
+def shared_store_authkey():
+    """FRAGMENT_CACHE_AUTHKEY as bytes, or None when it is unset."""
+    authkey = os.environ.get("FRAGMENT_CACHE_AUTHKEY")
+    return authkey.encode() if authkey else None
+
+
+def _require_authkey(authkey):
+    if not authkey:
+        raise ValueError("The shared fragment store needs an authkey (set FRAGMENT_CACHE_AUTHKEY)")
+
+
+def _fragment_store(maxsize=None):
+    """The LRU behind a fragment cache: FRAGMENT_CACHE_SIZE entries, each kept FRAGMENT_CACHE_TTL seconds."""
+    return TTLCache(
+        maxsize=maxsize or int(os.environ.get("FRAGMENT_CACHE_SIZE", 10000)),
+        ttl=int(os.environ.get("FRAGMENT_CACHE_TTL", 3600))
+    )
+
+
+def serve_shared_store(address, authkey, maxsize=None):
+    """Run a stand-in shared fragment store (an LRU in this process) forever."""
+    _require_authkey(authkey)
+    store = _fragment_store(maxsize)
+    _StoreManager.register("get_store", callable=lambda: store, proxytype=_StoreProxy)
+    _StoreManager(address=address, authkey=authkey).get_server().serve_forever()
+
+
+def connect_shared_store(address, authkey):
+    _require_authkey(authkey)
+    _StoreManager.register("get_store", proxytype=_StoreProxy)
+    manager = _StoreManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.get_store()
+
+
+def _fragment_backend():
+    # FRAGMENT_CACHE_ADDRESS=host:port points every worker at one shared store
+    # (see `flask fragment-cache-server`); otherwise each process keeps its own LRU.
+    address = os.environ.get("FRAGMENT_CACHE_ADDRESS")
+    authkey = shared_store_authkey()
+    if address and not authkey:
+        print("⚠️  FRAGMENT_CACHE_ADDRESS is set but FRAGMENT_CACHE_AUTHKEY is not; using local cache.")
+    elif address:
+        host, port = address.rsplit(":", 1)
+        try:
+            return SharedBackend(connect_shared_store((host, int(port)), authkey))
+        except OSError as e:
+            print(f"⚠️  Shared fragment cache at {address} unavailable ({e}); using local cache.")
+    return _fragment_store()
+
+
+fragment_cache = FragmentCache(_fragment_backend())
@@ -0,0 +1,285 @@
+"""
+In-memory friendship graph for "people you may know".
+
+Ranking non-friends by mutual friends with self-joins on friendship would
+touch friends x friends rows per request on the primary. Instead each worker
+keeps the graph as one sorted array('i') of friend ids per user (4 bytes an
+edge), loaded once and then kept current incrementally:
+
+- a background thread loads it when first needed and rebuilds it every
+  GRAPH_RELOAD_SECONDS (dropping edges that went with deleted users),
+  swapping the new lists in whole, so no request waits for a full load
+- accept_friend_requests() adds the new edges in the worker that handled it
+- every GRAPH_REFRESH_SECONDS, edges other workers inserted meanwhile are
+  pulled in by friendship.id (rows are only ever appended). Ids are handed
+  out at insert but become visible at commit, possibly out of order, so each
+  refresh re-reads the last GRAPH_REFRESH_OVERLAP ids as well
+
+Mutual friends for a page of users are intersections of these sorted arrays,
+cached per pair and stamped with each user's generation (bumped whenever
+their friend list changes) and the number of full loads, so a new friendship
+invalidates exactly the pairs involving its two users and a reload all of them.
+"""
+import heapq
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from . import get_db_connection
+from .cache import TTLCache
+
+GRAPH_REFRESH_SECONDS = int(os.environ.get("GRAPH_REFRESH_SECONDS", 5))
+GRAPH_RELOAD_SECONDS = int(os.environ.get("GRAPH_RELOAD_SECONDS", 3600))
+GRAPH_REFRESH_OVERLAP = int(os.environ.get("GRAPH_REFRESH_OVERLAP", 1000))
+# At most this many friend-of-friend edges are walked per suggestion request
+SUGGESTION_EDGE_BUDGET = int(os.environ.get("SUGGESTION_EDGE_BUDGET", 200000))
+LOAD_BATCH_SIZE = 10000
+MUTUAL_CACHE_SIZE = int(os.environ.get("MUTUAL_CACHE_SIZE", 100000))
+
+_EMPTY = array('i')
+
+
+class FriendGraph:
+    def __init__(self):
+        # Reentrant: load() holds it while refresh() inserts edges
+        self._lock = threading.RLock()
+        # Held by the one request refreshing; the others don't wait for it
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        # Entries are validated by generation, so the TTL only ages out idle pairs
+        self._mutual_cache = TTLCache(maxsize=MUTUAL_CACHE_SIZE, ttl=GRAPH_RELOAD_SECONDS)
+        self._loader = None
+        self._wake = threading.Event()
+        self._epoch = 0
+        # Counts swaps of the whole graph; part of every cached intersection's
+        # stamp, since generations start again from nothing after a swap
+        self._loads = 0
+        self.reset()
+
+    def reset(self):
+        """Forget everything; the next ensure_current() has the loader load afresh."""
+        with self._lock:
+            self._adjacency = {}
+            self._generation = {}
+            self._last_id = 0
+            self._refreshed_at = None
+            self._loaded_at = None
+            self._mutual_cache.clear()
+            self._loads += 1
+            # A load or refresh already reading the old database must not land
+            self._epoch += 1
+
+    # ------------------------------
+    # Edges
+    # ------------------------------
+    def friends(self, user_id):
+        """Sorted array of the user's friend ids (do not modify)."""
+        return self._adjacency.get(user_id, _EMPTY)
+
+    def add_edge(self, a, b):
+        """Record a friendship both ways; a no-op if it is already known."""
+        with self._lock:
+            self._insert(a, b)
+            self._insert(b, a)
+
+    def _insert(self, user_id, friend_id):
+        # Writers serialize on the lock; readers don't need it, because each
+        # list is copied and swapped in whole, never changed in place
+        with self._lock:
+            current = self._adjacency.get(user_id, _EMPTY)
+            position = bisect_left(current, friend_id)
+            if position < len(current) and current[position] == friend_id:
+                return
+            updated = current[:position]
+            updated.append(friend_id)
+            updated.extend(current[position:])
+            self._adjacency[user_id] = updated
+            self._generation[user_id] = self._generation.get(user_id, 0) + 1
+
+    def edge_count(self):
+        return sum(len(friends) for friends in self._adjacency.values())
+
+    # ------------------------------
+    # Loading
+    # ------------------------------
+    def load(self):
+        """Rebuild the whole graph from the friendship table and swap it in.
+
+        The table is read without the lock, so readers and add_edge() carry
+        on meanwhile; edges committed during the read are caught by a refresh
+        under the lock right after the swap.
+        """
+        epoch = self._epoch
+        adjacency = {}
+        last_id = 0
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        # Ordered by the unique (user1_id, user2_id) key, so every array comes out sorted
+        cursor.execute("SELECT id, user1_id, user2_id FROM friendship ORDER BY user1_id, user2_id")
+        while True:
+            rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                adjacency.setdefault(row['user1_id'], array('i')).append(row['user2_id'])
+                last_id = max(last_id, row['id'])
+        conn.close()
+
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._adjacency = adjacency
+            # Any list may have changed, so every cached intersection goes.
+            # A reader that took its stamp before the swap may still store a
+            # result computed from the old lists; bumping _loads keeps that
+            # stamp from matching once the generations count back up
+            self._generation = {}
+            self._loads += 1
+            self._mutual_cache.clear()
+            self._last_id = last_id
+            self._loaded_at = time.monotonic()
+            self.refresh()
+
+    def refresh(self):
+        """Pull in friendships inserted (by any worker) since the last load or refresh.
+
+        Re-reads the trailing GRAPH_REFRESH_OVERLAP ids too, catching rows
+        whose transaction committed after a higher id had already been seen;
+        edges already known are skipped by _insert().
+        """
+        epoch = self._epoch
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, user1_id, user2_id FROM friendship WHERE id > %s ORDER BY id",
+            (max(self._last_id - GRAPH_REFRESH_OVERLAP, 0),)
+        )
+        rows = cursor.fetchall()
+        conn.close()
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            for row in rows:
+                self._insert(row['user1_id'], row['user2_id'])
+                self._last_id = max(self._last_id, row['id'])
+            self._refreshed_at = time.monotonic()
+
+    def start(self):
+        """Start the thread that loads the graph and rebuilds it every GRAPH_RELOAD_SECONDS."""
+        with self._start_lock:
+            if self._loader is None:
+                self._loader = threading.Thread(target=self._run_loader, name="friend-graph", daemon=True)
+                self._loader.start()
+
+    def _run_loader(self):
+        while True:
+            try:
+                self.load()
+                wait = GRAPH_RELOAD_SECONDS
+            except Exception as e:
+                print(f"⚠️  Could not load the friend graph: {e}")
+                wait = GRAPH_REFRESH_SECONDS
+            if self._loaded_at is not None:
+                # Requests that asked for a load while this one ran are served
+                self._wake.clear()
+            self._wake.wait(wait)
+
+    def ensure_current(self):
+        """Start the loader on first use, then refresh when the data has aged.
+
+        Never waits for a load: until the first one finishes the graph only
+        holds the edges this worker added itself.
+        """
+        if self._loader is None:
+            self.start()
+        if self._loaded_at is None:
+            # After reset(): have the loader start over now
+            self._wake.set()
+        refreshed_at = self._refreshed_at
+        if refreshed_at is None or time.monotonic() - refreshed_at < GRAPH_REFRESH_SECONDS:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            refreshed_at = self._refreshed_at
+            if refreshed_at is not None and time.monotonic() - refreshed_at >= GRAPH_REFRESH_SECONDS:
+                self.refresh()
+        finally:
+            self._refresh_lock.release()
+
+    # ------------------------------
+    # Suggestions
+    # ------------------------------
+    def suggestions(self, user_id, limit=10, exclude=(), budget=SUGGESTION_EDGE_BUDGET):
+        """Non-friends ranked by mutual friends: [(user_id, mutual_count)], best first.
+
+        Friends are visited smallest friend list first (the most telling
+        introductions) until `budget` edges have been walked, which bounds
+        the time spent on users with huge friend lists.
+        """
+        friends = self.friends(user_id)
+        known = set(friends)
+        known.add(user_id)
+        known.update(exclude)
+
+        counts = {}
+        walked = 0
+        for friend in sorted(friends, key=lambda f: len(self.friends(f))):
+            theirs = self.friends(friend)
+            walked += len(theirs)
+            if walked > budget:
+                break
+            for candidate in theirs:
+                if candidate not in known:
+                    counts[candidate] = counts.get(candidate, 0) + 1
+        # Most mutual friends first, then the lower (older) id
+        return heapq.nsmallest(limit, counts.items(), key=lambda item: (-item[1], item[0]))
+
+    # ------------------------------
+    # Mutual friends
+    # ------------------------------
+    def mutual_friends(self, viewer_id, user_ids):
+        """{user_id: sorted tuple of friends they share with the viewer} for a page of users."""
+        mutual = {}
+        for user_id in user_ids:
+            if user_id == viewer_id:
+                mutual[user_id] = ()
+                continue
+            key = (min(viewer_id, user_id), max(viewer_id, user_id))
+            stamp = (self._loads, self._generation.get(key[0], 0), self._generation.get(key[1], 0))
+            cached = self._mutual_cache.get(key)
+            if cached is not None and cached[0] == stamp:
+                mutual[user_id] = cached[1]
+                continue
+            # The lists are read after the stamp: writers swap a list in
+            # before bumping its generation, and load() the lists before _loads
+            shared = intersect_sorted(self.friends(viewer_id), self.friends(user_id))
+            self._mutual_cache.set(key, (stamp, shared))
+            mutual[user_id] = shared
+        return mutual
+
+
+def intersect_sorted(a, b):
+    """Intersection of two sorted id arrays, as a sorted tuple.
+
+    Walks the shorter array and binary-searches the longer one from the last
+    match onwards, so a user with a handful of friends is compared against
+    one with thousands in a few dozen steps.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    shared = []
+    low = 0
+    end = len(b)
+    for value in a:
+        low = bisect_left(b, value, low, end)
+        if low == end:
+            break
+        if b[low] == value:
+            shared.append(value)
+    return tuple(shared)
+
+
+friend_graph = FriendGraph()
@@ -0,0 +1,205 @@
+"""
+Image uploads.
+
+New uploads are content addressed: stored once under MEDIA_ROOT as
+ab/<sha256>.<ext>, with a reference count in media_object so the same photo
+uploaded twice takes the disk once and goes away with its last post or
+avatar. Because the bytes behind a URL never change, /media/ serves them as
+immutable. (Files uploaded before this keep their old names in static/.)
+
+After saving, a small pool of workers writes WebP variants next to the
+original and records their filenames on the post or user, so feeds serve a
+720px card instead of a multi-megabyte photo. Until a variant exists (or when
+Pillow is not installed) templates fall back to the original through
+image_url().
+"""
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import url_for
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # variants are optional; originals are served instead
+    Image = None
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "media"))
+POST_FOLDER = "uploads"
+AVATAR_FOLDER = "profile_pictures"
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'jfif', 'gif', 'webp'}
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", 10)) * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# variant name -> (max width, max height, crop to fill the box). Posts and
+# avatars share MEDIA_ROOT and variants are named <stem>.<variant>.webp, so
+# the two families must not reuse a name
+POST_VARIANTS = {"thumb": (320, 320, False), "card": (720, 720, False)}
+AVATAR_VARIANTS = {"avatar": (160, 160, True)}
+VARIANT_QUALITY = 80
+
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get("IMAGE_WORKERS", 2)),
+                              thread_name_prefix="image-variants")
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload grows past MAX_UPLOAD_BYTES while being saved."""
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+# ------------------------------
+# Content-addressed store
+# ------------------------------
+def is_media_key(name):
+    """Content-addressed keys contain their shard directory; legacy filenames don't."""
+    return bool(name) and "/" in name
+
+
+def media_path(folder, name):
+    """Where `name` lives on disk: the media store for keys, static/<folder> otherwise."""
+    if is_media_key(name):
+        return os.path.join(MEDIA_ROOT, name)
+    return os.path.join(STATIC_FOLDER, folder, name)
+
+
+def save_upload(file, max_bytes=MAX_UPLOAD_BYTES):
+    """Store an uploaded file by content hash; returns its media key.
+
+    The file is streamed to a temporary file in chunks (hashing as it goes)
+    and nothing is kept if it exceeds `max_bytes` (UploadTooLarge). The key's
+    reference is taken before the file is moved into place, so a concurrent
+    release of the same content can't delete it from under us; the caller
+    must store the key on a row or give the reference back with
+    models.release_media().
+    """
+    from .models import acquire_media, release_media
+    os.makedirs(MEDIA_ROOT, exist_ok=True)
+    digest = hashlib.sha256()
+    written = 0
+    handle, partial = tempfile.mkstemp(dir=MEDIA_ROOT, suffix=".part")
+    try:
+        with os.fdopen(handle, "wb") as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"Uploads are limited to {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                out.write(chunk)
+
+        ext = os.path.splitext(file.filename or "")[1].lower()
+        if ext[1:] not in ALLOWED_EXTENSIONS:
+            ext = ""
+        hexdigest = digest.hexdigest()
+        key = f"{hexdigest[:2]}/{hexdigest}{ext}"
+        acquire_media(key)
+        try:
+            os.makedirs(os.path.dirname(media_path(None, key)), exist_ok=True)
+            os.replace(partial, media_path(None, key))
+        except Exception:
+            # The caller never sees the key, so give its reference back here
+            release_media(key)
+            raise
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return key
+
+
+def remove_media_files(key):
+    """Delete a stored original and every variant derived from it."""
+    path = media_path(None, key)
+    stem = os.path.splitext(path)[0]
+    variants = {**POST_VARIANTS, **AVATAR_VARIANTS}
+    for path in [path] + [f"{stem}.{variant}.webp" for variant in variants]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# ------------------------------
+# Variants
+# ------------------------------
+def make_variants(folder, filename, variants):
+    """Write a WebP rendition of an image per variant, next to it; returns {variant: filename}."""
+    if Image is None:
+        return {}
+    stem = os.path.splitext(filename)[0]
+    made = {}
+    # Identical uploads share a key, so their variants may already be on disk
+    wanted = {variant: f"{stem}.{variant}.webp" for variant in variants}
+    if all(os.path.exists(media_path(folder, name)) for name in wanted.values()):
+        return wanted
+    with Image.open(media_path(folder, filename)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        for variant, (width, height, crop) in variants.items():
+            if crop:
+                resized = ImageOps.fit(image, (width, height))
+            else:
+                resized = image.copy()
+                resized.thumbnail((width, height))
+            resized.save(media_path(folder, wanted[variant]), "WEBP", quality=VARIANT_QUALITY)
+            made[variant] = wanted[variant]
+    return made
+
+
+def _variants_or_none(folder, filename, variants):
+    try:
+        return make_variants(folder, filename, variants)
+    except Exception as e:
+        print(f"⚠️  Could not resize {folder}/{filename}: {e}")
+        return {}
+
+
+def build_post_variants(post_id, filename):
+    from .models import set_post_image_variants
+    made = _variants_or_none(POST_FOLDER, filename, POST_VARIANTS)
+    if made:
+        set_post_image_variants(post_id, filename, made["thumb"], made["card"])
+    return made
+
+
+def build_avatar_variants(user_id, filename):
+    from .models import set_profile_picture_thumb
+    made = _variants_or_none(AVATAR_FOLDER, filename, AVATAR_VARIANTS)
+    if made:
+        set_profile_picture_thumb(user_id, filename, made["avatar"])
+    return made
+
+
+def process_post_image(post_id, filename):
+    """Queue variant generation for a post's image; returns the Future."""
+    return executor.submit(build_post_variants, post_id, filename)
+
+
+def process_profile_picture(user_id, filename):
+    """Queue variant generation for a user's new profile picture; returns the Future."""
+    return executor.submit(build_avatar_variants, user_id, filename)
+
+
+def backfill_variants():
+    """Synchronously build missing variants for existing images; returns (posts, users) done."""
+    from .models import get_posts_without_variants, get_users_without_variants
+    posts = sum(1 for post in get_posts_without_variants()
+                if build_post_variants(post['id'], post['image']))
+    users = sum(1 for user in get_users_without_variants()
+                if build_avatar_variants(user['id'], user['profile_picture']))
+    return posts, users
+
+
+def image_url(folder, original, variant=None):
+    """URL of `variant` once it has been generated, else of the original."""
+    name = variant or original
+    if is_media_key(name):
+        return url_for('views.media_file', key=name)
+    return url_for('static', filename=f"{folder}/{name}")
@@ -0,0 +1,368 @@
+"""
+Numbered schema migrations.
+
+Every migration runs exactly once per database: the versions already applied
+are recorded in the schema_version table, and run_migrations() only applies
+the ones above the current maximum, in order. Migrations are written to be
+safe on databases that already picked up part of a change by hand (they check
+the catalog before adding an index or column). They run unchanged on MySQL and
+on the embedded SQLite backend.
+
+To change the schema, append a new (version, description, function) entry to
+MIGRATIONS; never edit one that has shipped.
+"""
+
+# ------------------------------
+# Helpers
+# ------------------------------
+# The catalog lookups differ per backend; everything else in a migration is
+# plain SQL that the SQLite backend translates (see website/backends.py).
+def _is_sqlite(cursor):
+    return getattr(cursor, "dialect", "mysql") == "sqlite"
+
+
+def _has_index(cursor, table, name):
+    if _is_sqlite(cursor):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND tbl_name=%s AND name=%s", (table, name))
+    else:
+        cursor.execute(
+            """SELECT 1 FROM information_schema.statistics
+               WHERE table_schema=DATABASE() AND table_name=%s AND index_name=%s LIMIT 1""",
+            (table, name)
+        )
+    return cursor.fetchone() is not None
+
+
+def _has_column(cursor, table, column):
+    if _is_sqlite(cursor):
+        cursor.execute("SELECT 1 FROM pragma_table_info(%s) WHERE name=%s", (table, column))
+    else:
+        cursor.execute(
+            """SELECT 1 FROM information_schema.columns
+               WHERE table_schema=DATABASE() AND table_name=%s AND column_name=%s LIMIT 1""",
+            (table, column)
+        )
+    return cursor.fetchone() is not None
+
+
+def _has_table(cursor, table):
+    if _is_sqlite(cursor):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=%s", (table,))
+    else:
+        cursor.execute(
+            """SELECT 1 FROM information_schema.tables
+               WHERE table_schema=DATABASE() AND table_name=%s LIMIT 1""",
+            (table,)
+        )
+    return cursor.fetchone() is not None
+
+
+def ensure_index(cursor, table, name, columns, kind="INDEX"):
+    if _is_sqlite(cursor):
+        # SQLite has no FULLTEXT indexes; search falls back to scanning (FT_MATCH)
+        if kind.startswith("FULLTEXT") or _has_index(cursor, table, name):
+            return False
+        cursor.execute(f"CREATE {kind} {name} ON `{table}` {columns}")
+        return True
+    if _has_index(cursor, table, name):
+        return False
+    cursor.execute(f"ALTER TABLE `{table}` ADD {kind} {name} {columns}")
+    return True
+
+
+def ensure_column(cursor, table, column, definition):
+    if _has_column(cursor, table, column):
+        return False
+    cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN {column} {definition}")
+    return True
+
+
+def delete_duplicates(cursor, table, columns):
+    """Keep only the oldest row for each combination of `columns`; returns rows deleted."""
+    match = " AND ".join(f"a.{c} = b.{c}" for c in columns)
+    cursor.execute(
+        f"""DELETE FROM `{table}` WHERE id IN (
+                SELECT id FROM (
+                    SELECT a.id FROM `{table}` a JOIN `{table}` b ON {match} AND a.id > b.id
+                ) AS duplicates
+            )"""
+    )
+    return cursor.rowcount
+
+
+def backfill_timelines(cursor, max_length):
+    """Fill every user's timeline with their own and friends' latest published posts."""
+    cursor.execute(
+        """INSERT IGNORE INTO timeline (user_id, post_id, date)
+           SELECT user_id, post_id, date FROM (
+               SELECT r.user_id, p.id AS post_id, p.date,
+                      ROW_NUMBER() OVER (PARTITION BY r.user_id ORDER BY p.date DESC, p.id DESC) AS position
+               FROM (
+                   SELECT id AS user_id, id AS author_id FROM user
+                   UNION ALL
+                   SELECT user1_id, user2_id FROM friendship
+               ) r
+               JOIN post p ON p.user_id = r.author_id AND p.drafts = FALSE
+           ) ranked
+           WHERE position <= %s""",
+        (max_length,)
+    )
+
+
+# ------------------------------
+# Migrations
+# ------------------------------
+BASELINE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS user (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        email VARCHAR(150) UNIQUE NOT NULL,
+        password VARCHAR(150) NOT NULL,
+        first_name VARCHAR(150),
+        last_name VARCHAR(150),
+        profile_picture VARCHAR(1000),
+        bio VARCHAR(1500),
+        links VARCHAR(500),
+        date_joined DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS post (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title VARCHAR(100),
+        content VARCHAR(5000),
+        image VARCHAR(1000),
+        category VARCHAR(100),
+        drafts boolean default false,
+        tags VARCHAR(500),
+        date DATETIME,
+        user_id INT,
+        FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `like` (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        post_id INT,
+        FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
+        FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dislike (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        post_id INT,
+        FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
+        FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS comment (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        post_id INT,
+        data VARCHAR(1000),
+        date DATETIME,
+        FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
+        FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reply_comment (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        comment_id INT,
+        post_id INT,
+        data VARCHAR(1000),
+        date DATETIME,
+        FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
+        FOREIGN KEY (comment_id) REFERENCES comment(id) ON DELETE CASCADE,
+        FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS comment_like (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        post_id INT,
+        comment_id INT,
+        FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
+        FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE,
+        FOREIGN KEY (comment_id) REFERENCES comment(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS friend_request (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        sender_id INT,
+        receiver_id INT,
+        status ENUM('pending', 'accepted', 'rejected') DEFAULT 'pending',
+        date_sent DATETIME,
+        date_responded DATETIME,
+        FOREIGN KEY (sender_id) REFERENCES user(id) ON DELETE CASCADE,
+        FOREIGN KEY (receiver_id) REFERENCES user(id) ON DELETE CASCADE,
+        UNIQUE KEY unique_request (sender_id, receiver_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS friendship (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user1_id INT,
+        user2_id INT,
+        date_created DATETIME,
+        FOREIGN KEY (user1_id) REFERENCES user(id) ON DELETE CASCADE,
+        FOREIGN KEY (user2_id) REFERENCES user(id) ON DELETE CASCADE,
+        UNIQUE KEY unique_friendship (user1_id, user2_id)
+    )
+    """,
+]
+
+
+def _baseline(cursor):
+    for statement in BASELINE_TABLES:
+        cursor.execute(statement)
+
+
+def _post_feed_index(cursor):
+    ensure_index(cursor, "post", "idx_post_feed", "(drafts, date, id)")
+
+
+def _post_counters(cursor):
+    added = False
+    for column in ("likes_count", "dislikes_count", "comments_count"):
+        added |= ensure_column(cursor, "post", column, "INT NOT NULL DEFAULT 0")
+    if added:
+        _recount_posts(cursor)
+
+
+def _search_indexes(cursor):
+    ensure_index(cursor, "post", "idx_post_search", "(title, content)", kind="FULLTEXT INDEX")
+    ensure_index(cursor, "user", "idx_user_search", "(first_name, last_name, email)", kind="FULLTEXT INDEX")
+
+
+def _secondary_indexes(cursor):
+    # Double clicks have left duplicate reactions behind; they must go before
+    # the unique keys can be built, and the counters must follow
+    removed = delete_duplicates(cursor, "like", ("post_id", "user_id"))
+    removed += delete_duplicates(cursor, "dislike", ("post_id", "user_id"))
+    delete_duplicates(cursor, "comment_like", ("comment_id", "user_id"))
+    if removed:
+        _recount_posts(cursor)
+
+    ensure_index(cursor, "like", "uq_like_post_user", "(post_id, user_id)", kind="UNIQUE INDEX")
+    ensure_index(cursor, "dislike", "uq_dislike_post_user", "(post_id, user_id)", kind="UNIQUE INDEX")
+    ensure_index(cursor, "comment_like", "uq_comment_like_comment_user", "(comment_id, user_id)", kind="UNIQUE INDEX")
+    ensure_index(cursor, "post", "idx_post_user_date", "(user_id, date)")
+    ensure_index(cursor, "comment", "idx_comment_post_date", "(post_id, date)")
+    ensure_index(cursor, "reply_comment", "idx_reply_comment_date", "(comment_id, date)")
+    ensure_index(cursor, "friend_request", "idx_friend_request_receiver", "(receiver_id, status, date_sent)")
+    ensure_index(cursor, "friend_request", "idx_friend_request_sender", "(sender_id, status, date_sent)")
+    ensure_index(cursor, "user", "idx_user_name", "(first_name, last_name)")
+
+
+def _timeline(cursor):
+    from .models import TIMELINE_MAX_LENGTH
+
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS timeline (
+               user_id INT NOT NULL,
+               post_id INT NOT NULL,
+               date DATETIME NOT NULL,
+               PRIMARY KEY (user_id, date, post_id),
+               FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
+               FOREIGN KEY (post_id) REFERENCES post(id) ON DELETE CASCADE
+           )"""
+    )
+    backfill_timelines(cursor, TIMELINE_MAX_LENGTH)
+
+
+def _version_stamps(cursor):
+    ensure_column(cursor, "post", "version", "INT NOT NULL DEFAULT 1")
+    ensure_column(cursor, "user", "version", "INT NOT NULL DEFAULT 1")
+
+
+def _image_variants(cursor):
+    ensure_column(cursor, "post", "image_thumb", "VARCHAR(1000)")
+    ensure_column(cursor, "post", "image_card", "VARCHAR(1000)")
+    ensure_column(cursor, "user", "profile_picture_thumb", "VARCHAR(1000)")
+
+
+def _media_objects(cursor):
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS media_object (
+               media_key VARCHAR(255) PRIMARY KEY,
+               refcount INT NOT NULL DEFAULT 0,
+               created_at DATETIME
+           )"""
+    )
+
+
+def _recount_posts(cursor):
+    cursor.execute(
+        """UPDATE post SET
+               likes_count = (SELECT COUNT(*) FROM `like` WHERE `like`.post_id = post.id),
+               dislikes_count = (SELECT COUNT(*) FROM dislike WHERE dislike.post_id = post.id),
+               comments_count = (SELECT COUNT(*) FROM comment WHERE comment.post_id = post.id)"""
+    )
+
+
+MIGRATIONS = [
+    (1, "baseline tables", _baseline),
+    (2, "post feed index", _post_feed_index),
+    (3, "post like/dislike/comment counters", _post_counters),
+    (4, "full-text search indexes", _search_indexes),
+    (5, "secondary indexes and unique reactions", _secondary_indexes),
+    (6, "friends timeline", _timeline),
+    (7, "post and user version stamps", _version_stamps),
+    (8, "resized image variants", _image_variants),
+    (9, "content-addressed media reference counts", _media_objects),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ------------------------------
+# Runner
+# ------------------------------
+def current_version(cursor):
+    if not _has_table(cursor, "schema_version"):
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+    return cursor.fetchone()['version']
+
+
+def run_migrations(conn):
+    """Apply every pending migration in order; returns the versions applied."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS schema_version (
+               version INT PRIMARY KEY,
+               description VARCHAR(255),
+               applied_at DATETIME
+           )"""
+    )
+    # Serialise concurrent runners (e.g. several workers booting at once)
+    cursor.execute("SELECT GET_LOCK('schema_migrations', 300) AS locked")
+    if not cursor.fetchone()['locked']:
+        raise RuntimeError("Timed out waiting for the schema migration lock")
+
+    applied = []
+    try:
+        version = current_version(cursor)
+        for number, description, migrate in MIGRATIONS:
+            if number <= version:
+                continue
+            print(f"⏳ Applying migration {number}: {description}")
+            migrate(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, NOW())",
+                (number, description)
+            )
+            conn.commit()
+            applied.append(number)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+        cursor.fetchall()
+    return applied
@@ -1,4 +1,21 @@
+import base64
+import json
+import re
+from datetime import datetime
+
 from . import get_db_connection
+from .cache import user_cache
+from .graph import friend_graph
+
+FEED_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 20
+PEOPLE_PAGE_SIZE = 24
+PROFILE_PAGE_SIZE = 5
+SUGGESTION_COUNT = 6
+MUTUAL_NAMES_SHOWN = 3
+COMMENT_PAGE_SIZE = 20
+REPLY_PAGE_SIZE = 3
+TIMELINE_MAX_LENGTH = 500
 
 # ------------------------------
 # User functions
@@ -20,9 +37,60 @@ def update_user(user_id, fields):
     set_string = ", ".join([f"{k}=%s" for k in fields.keys()])
     values = list(fields.values())
     values.append(user_id)
-    cursor.execute(f"UPDATE user SET {set_string} WHERE id=%s", values)
+    # Bumping the version invalidates every cached fragment showing this user
+    cursor.execute(f"UPDATE user SET {set_string}, version = version + 1 WHERE id=%s", values)
     conn.commit()
     conn.close()
+    # Drop the cached login object so the change shows on the next request
+    user_cache.invalidate(int(user_id))
+
+
+def set_profile_picture(user_id, profile_picture):
+    """Switch the user's picture, releasing the previous upload in the same transaction."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT profile_picture FROM user WHERE id=%s FOR UPDATE", (user_id,))
+        previous = cursor.fetchone()
+        cursor.execute(
+            "UPDATE user SET profile_picture=%s, profile_picture_thumb=NULL, version = version + 1 WHERE id=%s",
+            (profile_picture, user_id)
+        )
+        # Also when re-uploading the same picture: the upload took a reference
+        # of its own, and the user row still holds only one
+        if previous:
+            _release_media(cursor, previous['profile_picture'])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    user_cache.invalidate(int(user_id))
+
+
+def set_profile_picture_thumb(user_id, profile_picture, thumb):
+    """Record the avatar thumbnail, unless the user has changed pictures meanwhile."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE user SET profile_picture_thumb=%s, version = version + 1 WHERE id=%s AND profile_picture=%s",
+        (thumb, user_id, profile_picture)
+    )
+    conn.commit()
+    conn.close()
+    user_cache.invalidate(int(user_id))
+
+
+def get_users_without_variants():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, profile_picture FROM user WHERE profile_picture IS NOT NULL AND profile_picture_thumb IS NULL"
+    )
+    users = cursor.fetchall()
+    conn.close()
+    return users
 
 
 def get_user_by_email(email):
@@ -43,6 +111,63 @@ def get_user_by_id(user_id):
     return user
 
 
+# ------------------------------
+# Media reference counts
+# ------------------------------
+# Uploads are stored once per content hash (see media.py); media_object counts
+# the posts and users pointing at each so the files go with the last of them.
+def acquire_media(key):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT IGNORE INTO media_object (media_key, refcount, created_at) VALUES (%s, 0, NOW())",
+            (key,)
+        )
+        cursor.execute("UPDATE media_object SET refcount = refcount + 1 WHERE media_key=%s", (key,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _release_media(cursor, key):
+    """Drop one reference to `key` in the caller's transaction, deleting the files with the last.
+
+    The files are removed while the row is still locked, so an upload of the
+    same content waits for this transaction and then stores its file afresh.
+    """
+    from .media import is_media_key, remove_media_files
+    if not is_media_key(key):
+        return False
+    cursor.execute("SELECT refcount FROM media_object WHERE media_key=%s FOR UPDATE", (key,))
+    row = cursor.fetchone()
+    if row is None:
+        return False
+    if row['refcount'] > 1:
+        cursor.execute("UPDATE media_object SET refcount = refcount - 1 WHERE media_key=%s", (key,))
+        return False
+    cursor.execute("DELETE FROM media_object WHERE media_key=%s", (key,))
+    remove_media_files(key)
+    return True
+
+
+def release_media(key):
+    """Give back a reference taken by media.save_upload() that was never stored on a row."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        _release_media(cursor, key)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
 # ------------------------------
 # Post functions
 # ------------------------------
@@ -70,25 +195,144 @@ def create_post_with_image(title, content, user_id, image=None, category=None, t
             "INSERT INTO post (title, content, image, category, tags, drafts, date, user_id) VALUES (%s, %s, %s, %s, %s, %s, NOW(), %s)",
             (title, content, image, category, tags, is_draft, user_id)
         )
+        post_id = cursor.lastrowid
+        if not is_draft:
+            _fan_out_post(cursor, post_id, user_id)
         conn.commit()
-        print(f"DEBUG MODEL: Post inserted successfully with ID: {cursor.lastrowid}")
+        print(f"DEBUG MODEL: Post inserted successfully with ID: {post_id}")
     except Exception as e:
         print(f"DEBUG MODEL: Error inserting post: {e}")
         conn.rollback()
         raise e
     finally:
         conn.close()
+    return post_id
 
 
-def get_user_posts(user_id):
+def set_post_image_variants(post_id, image, thumb, card):
+    """Record a post's resized images (bumping its version so cached cards re-render)."""
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM post WHERE user_id=%s ORDER BY date DESC", (user_id,))
+    cursor.execute(
+        "UPDATE post SET image_thumb=%s, image_card=%s, version = version + 1 WHERE id=%s AND image=%s",
+        (thumb, card, post_id, image)
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_posts_without_variants():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, image FROM post WHERE image IS NOT NULL AND image_card IS NULL")
     posts = cursor.fetchall()
     conn.close()
     return posts
 
 
+def _fan_out_post(cursor, post_id, author_id):
+    """Push a newly published post onto the timelines of its author and their friends.
+
+    Only appends: timelines that grow past TIMELINE_MAX_LENGTH are cut back
+    by trim_timelines(), off the posting transaction.
+    """
+    cursor.execute(
+        """INSERT INTO timeline (user_id, post_id, date)
+           SELECT recipients.user_id, p.id, p.date
+           FROM post p CROSS JOIN (
+               SELECT %s AS user_id
+               UNION ALL
+               SELECT user2_id FROM friendship WHERE user1_id = %s
+           ) recipients
+           WHERE p.id = %s""",
+        (author_id, author_id, post_id)
+    )
+
+
+def trim_timelines(max_length=TIMELINE_MAX_LENGTH):
+    """Cut every timeline longer than `max_length` back to its newest entries.
+
+    Meant to run periodically (`flask trim-timelines`). Only users over the
+    cap are touched, one short transaction each: their oldest kept entry is
+    found by walking the (user_id, date, post_id) primary key, and
+    everything older goes. Returns the number of entries removed.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT user_id FROM timeline GROUP BY user_id HAVING COUNT(*) > %s",
+        (max_length,)
+    )
+    user_ids = [row['user_id'] for row in cursor.fetchall()]
+
+    removed = 0
+    for user_id in user_ids:
+        cursor.execute(
+            """SELECT date, post_id FROM timeline WHERE user_id=%s
+               ORDER BY date DESC, post_id DESC LIMIT 1 OFFSET %s""",
+            (user_id, max_length)
+        )
+        boundary = cursor.fetchone()
+        if boundary:
+            cursor.execute(
+                """DELETE FROM timeline
+                   WHERE user_id=%s AND (date < %s OR (date = %s AND post_id <= %s))""",
+                (user_id, boundary['date'], boundary['date'], boundary['post_id'])
+            )
+            removed += cursor.rowcount
+        conn.commit()
+    conn.close()
+    return removed
+
+
+def get_user_posts(user_id, limit=None, cursor=None, include_drafts=True):
+    """The user's posts, newest first, optionally after a (date, id) cursor and capped at `limit`.
+
+    Reads the post(user_id, date) index, so only the rows asked for are fetched.
+    """
+    scan, params = _user_posts_scan(user_id, cursor, include_drafts)
+    sql = f"SELECT * {scan}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    posts = cursor.fetchall()
+    conn.close()
+    return posts
+
+
+def _user_posts_scan(user_id, cursor, include_drafts):
+    """FROM ... ORDER BY of a user's posts after a (date, id) cursor and its parameters.
+
+    Shared by get_user_posts() and get_profile_stamp() so both read the same rows.
+    """
+    sql = "FROM post WHERE user_id=%s"
+    params = [user_id]
+    if not include_drafts:
+        sql += " AND drafts = FALSE"
+    key = _date_id_key(cursor)
+    if key:
+        sql += " AND (date < %s OR (date = %s AND id < %s))"
+        params += [key[0], key[0], key[1]]
+    return sql + " ORDER BY date DESC, id DESC", params
+
+
+def get_profile_posts_page(user_id, viewer_id, cursor=None, limit=PROFILE_PAGE_SIZE):
+    """One page of a profile's posts, with drafts only for their author.
+
+    Returns (posts, next_cursor); next_cursor is None on the last page.
+    """
+    posts = get_user_posts(user_id, limit + 1, cursor, include_drafts=(user_id == viewer_id))
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1]['date'], posts[-1]['id'])
+    return posts, next_cursor
+
+
 def get_post_by_id(post_id):
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -110,20 +354,100 @@ def get_post_comments(post_id):
 # ------------------------------
 # Like / Dislike
 # ------------------------------
+# Each reaction/comment write also adjusts the matching counter column on post
+# in the same transaction, so reads never have to COUNT(*) the child tables.
+# The post's version is bumped with it so cached renderings of the post expire.
+def _adjust_post_counter(cursor, post_id, column, delta):
+    cursor.execute(
+        f"UPDATE post SET {column} = GREATEST({column} + %s, 0), version = version + 1 WHERE id=%s",
+        (delta, post_id)
+    )
+
+
 def like_post(user_id, post_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO `like` (user_id, post_id) VALUES (%s,%s)", (user_id, post_id))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("INSERT INTO `like` (user_id, post_id) VALUES (%s,%s)", (user_id, post_id))
+        _adjust_post_counter(cursor, post_id, "likes_count", 1)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 
 def dislike_post(user_id, post_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO dislike (user_id, post_id) VALUES (%s,%s)", (user_id, post_id))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("INSERT INTO dislike (user_id, post_id) VALUES (%s,%s)", (user_id, post_id))
+        _adjust_post_counter(cursor, post_id, "dislikes_count", 1)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+REACTIONS = {
+    "like": ("`like`", "likes_count"),
+    "dislike": ("dislike", "dislikes_count"),
+}
+
+
+def toggle_reaction(user_id, post_id, kind):
+    """Toggle the user's "like" or "dislike" on a post in a single transaction.
+
+    Reacting again with the same kind removes the reaction; reacting with the
+    other kind swaps it. The unique (post_id, user_id) keys make INSERT IGNORE
+    a no-op for a concurrent duplicate (e.g. a double click), and the counter
+    columns are only moved by rows actually inserted or deleted.
+    Returns the new state and counts, or None if the post does not exist.
+    """
+    table, column = REACTIONS[kind]
+    other_table, other_column = REACTIONS["dislike" if kind == "like" else "like"]
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DELETE FROM {table} WHERE user_id=%s AND post_id=%s", (user_id, post_id))
+        if cursor.rowcount:
+            _adjust_post_counter(cursor, post_id, column, -cursor.rowcount)
+            active = False
+        else:
+            cursor.execute(f"DELETE FROM {other_table} WHERE user_id=%s AND post_id=%s", (user_id, post_id))
+            if cursor.rowcount:
+                _adjust_post_counter(cursor, post_id, other_column, -cursor.rowcount)
+            # Selecting the post inserts nothing if it is gone, rather than
+            # relying on IGNORE to swallow the foreign key error (SQLite won't)
+            cursor.execute(
+                f"INSERT IGNORE INTO {table} (user_id, post_id) SELECT %s, id FROM post WHERE id=%s",
+                (user_id, post_id)
+            )
+            if cursor.rowcount:
+                _adjust_post_counter(cursor, post_id, column, 1)
+            active = True
+
+        cursor.execute("SELECT likes_count, dislikes_count FROM post WHERE id=%s", (post_id,))
+        counts = cursor.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if not counts:
+        return None
+    return {
+        'liked': active and kind == "like",
+        'disliked': active and kind == "dislike",
+        'likes_count': counts['likes_count'],
+        'dislikes_count': counts['dislikes_count'],
+    }
 
 
 # ------------------------------
@@ -132,25 +456,53 @@ def dislike_post(user_id, post_id):
 def add_comment(user_id, post_id, data):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO comment (user_id, post_id, data, date) VALUES (%s, %s, %s, NOW())",
-        (user_id, post_id, data)
-    )
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute(
+            "INSERT INTO comment (user_id, post_id, data, date) VALUES (%s, %s, %s, NOW())",
+            (user_id, post_id, data)
+        )
+        _adjust_post_counter(cursor, post_id, "comments_count", 1)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 
 def reply_to_comment(user_id, comment_id, post_id, data):
     conn = get_db_connection()
     cursor = conn.cursor()
+    if post_id is None:
+        # Take the post from the parent comment
+        cursor.execute(
+            """INSERT INTO reply_comment (user_id, comment_id, post_id, data, date)
+               SELECT %s, id, post_id, %s, NOW() FROM comment WHERE id=%s""",
+            (user_id, data, comment_id)
+        )
+    else:
+        cursor.execute(
+            "INSERT INTO reply_comment (user_id, comment_id, post_id, data, date) VALUES (%s, %s, %s, %s, NOW())",
+            (user_id, comment_id, post_id, data)
+        )
+    # The thread changed: bump the post's version so cached pages expire
     cursor.execute(
-        "INSERT INTO reply_comment (user_id, comment_id, post_id, data, date) VALUES (%s, %s, %s, %s, NOW())",
-        (user_id, comment_id, post_id, data)
+        "UPDATE post SET version = version + 1 WHERE id = (SELECT post_id FROM comment WHERE id=%s)",
+        (comment_id,)
     )
     conn.commit()
     conn.close()
 
 
+def get_comment_by_id(comment_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM comment WHERE id=%s", (comment_id,))
+    comment = cursor.fetchone()
+    conn.close()
+    return comment
+
+
 def like_comment(user_id, post_id, comment_id):
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -158,6 +510,7 @@ def like_comment(user_id, post_id, comment_id):
         "INSERT INTO comment_like (user_id, post_id, comment_id) VALUES (%s,%s,%s)",
         (user_id, post_id, comment_id)
     )
+    cursor.execute("UPDATE post SET version = version + 1 WHERE id=%s", (post_id,))
     conn.commit()
     conn.close()
 
@@ -166,63 +519,99 @@ def like_comment(user_id, post_id, comment_id):
 # Friend Request functions
 # ------------------------------
 def send_friend_request(sender_id, receiver_id):
+    """Send a request unless one already exists between them this way; returns whether it was sent.
+
+    A single INSERT IGNORE against the unique (sender_id, receiver_id) key, so
+    two concurrent sends can't both get through.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    # Check if request already exists
-    cursor.execute(
-        "SELECT * FROM friend_request WHERE sender_id=%s AND receiver_id=%s",
+    sent = cursor.execute(
+        "INSERT IGNORE INTO friend_request (sender_id, receiver_id, status, date_sent) VALUES (%s, %s, 'pending', NOW())",
         (sender_id, receiver_id)
     )
-    existing = cursor.fetchone()
-    
-    if not existing:
-        cursor.execute(
-            "INSERT INTO friend_request (sender_id, receiver_id, status, date_sent) VALUES (%s, %s, 'pending', NOW())",
-            (sender_id, receiver_id)
-        )
-        conn.commit()
+    conn.commit()
     conn.close()
-    return not existing
+    return sent == 1
 
 
-def accept_friend_request(request_id):
+def _accept_requests(cursor, requests):
+    """Mark `requests` (rows with id, sender_id, receiver_id) accepted and befriend both ways."""
+    ids = [r['id'] for r in requests]
+    cursor.execute(
+        f"UPDATE friend_request SET status='accepted', date_responded=NOW() WHERE id IN ({_placeholders(ids)})",
+        ids
+    )
+    # INSERT IGNORE: an earlier request the other way may already have made them friends
+    cursor.executemany(
+        "INSERT IGNORE INTO friendship (user1_id, user2_id, date_created) VALUES (%s, %s, NOW())",
+        [(r['sender_id'], r['receiver_id']) for r in requests] +
+        [(r['receiver_id'], r['sender_id']) for r in requests]
+    )
+
+
+def accept_friend_requests(receiver_id, request_ids):
+    """Accept many pending requests sent to `receiver_id` in one transaction; returns how many.
+
+    Ids that aren't pending requests to this receiver are ignored.
+    """
+    if not request_ids:
+        return 0
     conn = get_db_connection()
     cursor = conn.cursor()
-    
-    # Get the request details
-    cursor.execute("SELECT * FROM friend_request WHERE id=%s", (request_id,))
-    request = cursor.fetchone()
-    
-    if request:
-        # Update request status
-        cursor.execute(
-            "UPDATE friend_request SET status='accepted', date_responded=NOW() WHERE id=%s",
-            (request_id,)
-        )
-        
-        # Add friendship both ways
-        cursor.execute(
-            "INSERT INTO friendship (user1_id, user2_id, date_created) VALUES (%s, %s, NOW())",
-            (request['sender_id'], request['receiver_id'])
-        )
-        cursor.execute(
-            "INSERT INTO friendship (user1_id, user2_id, date_created) VALUES (%s, %s, NOW())",
-            (request['receiver_id'], request['sender_id'])
-        )
-        
+    cursor.execute(
+        f"""SELECT id, sender_id, receiver_id FROM friend_request
+            WHERE receiver_id=%s AND status='pending' AND id IN ({_placeholders(request_ids)})
+            FOR UPDATE""",
+        [receiver_id] + list(request_ids)
+    )
+    requests = cursor.fetchall()
+    if requests:
+        _accept_requests(cursor, requests)
         conn.commit()
+    else:
+        # Nothing to accept; don't hold the locks taken by FOR UPDATE for the rest of the request
+        conn.rollback()
+    conn.close()
+
+    for request in requests:
+        friend_graph.add_edge(request['sender_id'], request['receiver_id'])
+    return len(requests)
+
+
+def reject_friend_requests(receiver_id, request_ids):
+    """Reject many pending requests sent to `receiver_id` in one statement; returns how many."""
+    if not request_ids:
+        return 0
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    rejected = cursor.execute(
+        f"""UPDATE friend_request SET status='rejected', date_responded=NOW()
+            WHERE receiver_id=%s AND status='pending' AND id IN ({_placeholders(request_ids)})""",
+        [receiver_id] + list(request_ids)
+    )
+    conn.commit()
     conn.close()
+    return rejected
+
 
+def cancel_friend_requests(sender_id, request_ids):
+    """Withdraw many pending requests `sender_id` sent, in one statement; returns how many.
 
-def reject_friend_request(request_id):
+    The rows are deleted, so the requests can be sent again later.
+    """
+    if not request_ids:
+        return 0
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE friend_request SET status='rejected', date_responded=NOW() WHERE id=%s",
-        (request_id,)
+    cancelled = cursor.execute(
+        f"""DELETE FROM friend_request
+            WHERE sender_id=%s AND status='pending' AND id IN ({_placeholders(request_ids)})""",
+        [sender_id] + list(request_ids)
     )
     conn.commit()
     conn.close()
+    return cancelled
 
 
 def get_pending_friend_requests(user_id):
@@ -272,6 +661,28 @@ def get_user_friends(user_id):
     return friends
 
 
+def get_relationship_status(viewer_id, user_id):
+    """The viewer's standing with another user, in a single query.
+
+    Returns is_friend, has_pending_request (they asked the viewer) and
+    has_sent_request (the viewer asked them) as booleans.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT
+               EXISTS(SELECT 1 FROM friendship WHERE user1_id = %s AND user2_id = %s) AS is_friend,
+               EXISTS(SELECT 1 FROM friend_request
+                      WHERE sender_id = %s AND receiver_id = %s AND status = 'pending') AS has_pending_request,
+               EXISTS(SELECT 1 FROM friend_request
+                      WHERE sender_id = %s AND receiver_id = %s AND status = 'pending') AS has_sent_request""",
+        (viewer_id, user_id, user_id, viewer_id, viewer_id, user_id)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return {k: bool(v) for k, v in row.items()}
+
+
 def are_friends(user1_id, user2_id):
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -284,23 +695,36 @@ def are_friends(user1_id, user2_id):
     return friendship is not None
 
 
-def search_users(query):
+# ------------------------------
+# Full-text search
+# ------------------------------
+def _fulltext_query(text):
+    """Turn free text into a BOOLEAN MODE query: every word required, prefix-matched."""
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f"+{w}*" for w in words)
+
+
+def search_users(query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """Users whose name or email matches every word of `query`, best match first.
+
+    Backed by the FULLTEXT index on user(first_name, last_name, email), which
+    InnoDB keeps in sync on every insert_user/update_user. This is the
+    non-streaming API, returning a list; pages use stream_search_users().
+    """
+    terms = _fulltext_query(query)
+    if not terms:
+        return []
     conn = get_db_connection()
     cursor = conn.cursor()
-    
-    # Make search case-insensitive and more flexible
-    search_term = f"%{query.lower()}%"
     cursor.execute(
-        """SELECT * FROM user 
-           WHERE LOWER(first_name) LIKE %s 
-           OR LOWER(last_name) LIKE %s 
-           OR LOWER(email) LIKE %s
-           OR LOWER(CONCAT(first_name, ' ', last_name)) LIKE %s
-           ORDER BY first_name, last_name""",
-        (search_term, search_term, search_term, search_term)
+        """SELECT *, MATCH(first_name, last_name, email) AGAINST (%s IN BOOLEAN MODE) AS relevance
+           FROM user
+           WHERE MATCH(first_name, last_name, email) AGAINST (%s IN BOOLEAN MODE)
+           ORDER BY relevance DESC, first_name, last_name
+           LIMIT %s OFFSET %s""",
+        (terms, terms, limit, offset)
     )
     users = cursor.fetchall()
-    print(f"DEBUG search_users: Query='{query}', Found {len(users)} users")
     conn.close()
     return users
 
@@ -315,14 +739,26 @@ def get_all_users():
     return users
 
 
-def search_posts(query):
+def search_posts(query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """Published posts whose title or content matches every word of `query`.
+
+    Ranked by relevance (newest first among ties) using the FULLTEXT index on
+    post(title, content), which InnoDB maintains as posts are created. This
+    is the non-streaming API, returning bare post rows; pages use
+    stream_search_posts().
+    """
+    terms = _fulltext_query(query)
+    if not terms:
+        return []
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        """SELECT * FROM post 
-           WHERE title LIKE %s OR content LIKE %s
-           ORDER BY date DESC""",
-        (f"%{query}%", f"%{query}%")
+        """SELECT *, MATCH(title, content) AGAINST (%s IN BOOLEAN MODE) AS relevance
+           FROM post
+           WHERE MATCH(title, content) AGAINST (%s IN BOOLEAN MODE) AND drafts = FALSE
+           ORDER BY relevance DESC, date DESC
+           LIMIT %s OFFSET %s""",
+        (terms, terms, limit, offset)
     )
     posts = cursor.fetchall()
     conn.close()
@@ -330,38 +766,74 @@ def search_posts(query):
 
 
 def delete_post(post_id):
+    # Likes, dislikes and comments cascade with the post, and its counters go
+    # with the row; only its image's reference count needs releasing
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM post WHERE id=%s", (post_id,))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("SELECT image FROM post WHERE id=%s FOR UPDATE", (post_id,))
+        post = cursor.fetchone()
+        cursor.execute("DELETE FROM post WHERE id=%s", (post_id,))
+        if post:
+            _release_media(cursor, post['image'])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 
-def get_post_likes(post_id):
+def _get_post_counter(post_id, column):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as count FROM `like` WHERE post_id=%s", (post_id,))
+    cursor.execute(f"SELECT {column} AS count FROM post WHERE id=%s", (post_id,))
     result = cursor.fetchone()
     conn.close()
     return result['count'] if result else 0
 
 
+def get_post_likes(post_id):
+    return _get_post_counter(post_id, "likes_count")
+
+
 def get_post_dislikes(post_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as count FROM dislike WHERE post_id=%s", (post_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result['count'] if result else 0
+    return _get_post_counter(post_id, "dislikes_count")
 
 
 def get_post_comments_count(post_id):
+    return _get_post_counter(post_id, "comments_count")
+
+
+def reconcile_post_counters(batch_size=1000):
+    """Recompute likes_count/dislikes_count/comments_count from the source tables.
+
+    Walks post ids in ranges of `batch_size`, committing after each range so
+    no lock is held for long, and only rewrites rows whose counters drifted.
+    Returns the number of posts that were repaired.
+    """
+    likes = "(SELECT COUNT(*) FROM `like` WHERE `like`.post_id = post.id)"
+    dislikes = "(SELECT COUNT(*) FROM dislike WHERE dislike.post_id = post.id)"
+    comments = "(SELECT COUNT(*) FROM comment WHERE comment.post_id = post.id)"
+
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as count FROM comment WHERE post_id=%s", (post_id,))
-    result = cursor.fetchone()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM post")
+    max_id = cursor.fetchone()['max_id']
+
+    repaired = 0
+    for start in range(0, max_id, batch_size):
+        cursor.execute(
+            f"""UPDATE post
+                SET likes_count = {likes}, dislikes_count = {dislikes}, comments_count = {comments}
+                WHERE id > %s AND id <= %s
+                  AND (likes_count <> {likes} OR dislikes_count <> {dislikes} OR comments_count <> {comments})""",
+            (start, start + batch_size)
+        )
+        repaired += cursor.rowcount
+        conn.commit()
     conn.close()
-    return result['count'] if result else 0
+    return repaired
 
 
 def user_liked_post(user_id, post_id):
@@ -385,17 +857,31 @@ def user_disliked_post(user_id, post_id):
 def remove_like(user_id, post_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM `like` WHERE user_id=%s AND post_id=%s", (user_id, post_id))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("DELETE FROM `like` WHERE user_id=%s AND post_id=%s", (user_id, post_id))
+        if cursor.rowcount:
+            _adjust_post_counter(cursor, post_id, "likes_count", -cursor.rowcount)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 
 def remove_dislike(user_id, post_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM dislike WHERE user_id=%s AND post_id=%s", (user_id, post_id))
-    conn.commit()
-    conn.close()
+    try:
+        cursor.execute("DELETE FROM dislike WHERE user_id=%s AND post_id=%s", (user_id, post_id))
+        if cursor.rowcount:
+            _adjust_post_counter(cursor, post_id, "dislikes_count", -cursor.rowcount)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 
 def get_all_posts():
@@ -404,7 +890,615 @@ def get_all_posts():
     cursor.execute("SELECT * FROM post WHERE drafts = FALSE ORDER BY date DESC")
     posts = cursor.fetchall()
     print(f"DEBUG get_all_posts: Retrieved {len(posts)} posts from database")
-    for post in posts:
-        print(f"DEBUG get_all_posts: Post ID {post['id']}: {post['title']}")
     conn.close()
     return posts
+
+
+# ------------------------------
+# Feed hydration
+# ------------------------------
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def hydrate_posts(posts, viewer_id):
+    """Attach the author and the viewer's own reaction to a list of post rows.
+
+    Like/dislike/comment counts are already columns on post. Runs a fixed
+    number of queries on a single connection no matter how many posts are
+    passed in. Returns [{'post': p, 'user': author}, ...] in the original
+    order; posts whose author no longer exists are dropped.
+    """
+    if not posts:
+        return []
+
+    post_ids = [p['id'] for p in posts]
+    user_ids = list({p['user_id'] for p in posts})
+    in_posts = _placeholders(post_ids)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(f"SELECT * FROM user WHERE id IN ({_placeholders(user_ids)})", user_ids)
+    authors = {u['id']: u for u in cursor.fetchall()}
+
+    cursor.execute(
+        f"""SELECT post_id, 'like' AS kind FROM `like` WHERE user_id = %s AND post_id IN ({in_posts})
+            UNION ALL
+            SELECT post_id, 'dislike' AS kind FROM dislike WHERE user_id = %s AND post_id IN ({in_posts})""",
+        [viewer_id] + post_ids + [viewer_id] + post_ids
+    )
+    mine = {(r['post_id'], r['kind']) for r in cursor.fetchall()}
+    conn.close()
+
+    hydrated = []
+    for p in posts:
+        user = authors.get(p['user_id'])
+        if not user:
+            continue
+        p['user_liked'] = (p['id'], 'like') in mine
+        p['user_disliked'] = (p['id'], 'dislike') in mine
+        hydrated.append({'post': p, 'user': user})
+    return hydrated
+
+
+# ------------------------------
+# Keyset pagination
+# ------------------------------
+def encode_cursor(*values):
+    """Pack the sort key of the last row on a page into an opaque URL-safe token."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); returns None for a missing or mangled token."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _date_id_key(cursor):
+    """Decode a (date, id) cursor as produced for post listings."""
+    values = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(values[0]), int(values[1])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _feed_scan(viewer_id, cursor, friends, join=""):
+    """FROM ... ORDER BY of one feed page (post aliased as p) and its parameters.
+
+    Shared by stream_feed() and get_feed_stamp() so both read the same rows;
+    `join` is added right after post p (e.g. to join its author).
+    """
+    key = _date_id_key(cursor)
+    if friends:
+        sql = f"FROM timeline t JOIN post p ON p.id = t.post_id {join} WHERE t.user_id = %s"
+        params = [viewer_id]
+        if key:
+            sql += " AND (t.date < %s OR (t.date = %s AND t.post_id < %s))"
+            params += [key[0], key[0], key[1]]
+        return sql + " ORDER BY t.date DESC, t.post_id DESC", params
+
+    sql = f"FROM post p {join} WHERE p.drafts = FALSE"
+    params = []
+    if key:
+        sql += " AND (p.date < %s OR (p.date = %s AND p.id < %s))"
+        params += [key[0], key[0], key[1]]
+    return sql + " ORDER BY p.date DESC, p.id DESC", params
+
+
+# ------------------------------
+# Streamed pages
+# ------------------------------
+class LazyPage:
+    """One page of rows, built as they are read from the database.
+
+    `rows` yields up to limit + 1 rows; the extra one only tells us there is
+    more. has_more and next_cursor (from `key` of the page's last row, for
+    keyset pages) are only known once iteration has finished, so templates
+    read them after their loop.
+    """
+
+    def __init__(self, rows, limit, key=None, build=None):
+        self._rows = rows
+        self._limit = limit
+        self._key = key
+        self._build = build or (lambda row: row)
+        self.has_more = False
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        count = 0
+        try:
+            for row in self._rows:
+                if count == self._limit:
+                    self.has_more = True
+                    if self._key:
+                        self.next_cursor = encode_cursor(*self._key(last))
+                    break
+                last = row
+                count += 1
+                yield self._build(row)
+        finally:
+            # Close the row stream now rather than at garbage collection, so an
+            # unbuffered cursor is drained before the connection's next query
+            if hasattr(self._rows, 'close'):
+                self._rows.close()
+
+
+def _stream_rows(sql, params):
+    """Run a query on an unbuffered cursor and yield its rows as they arrive."""
+    from . import backend
+    conn = get_db_connection()
+    cursor = conn.cursor(backend.streaming_cursor) if backend.streaming_cursor else conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield row
+    finally:
+        # Unread rows are drained here, so the connection is clean for its next user
+        cursor.close()
+        conn.close()
+
+
+# Fields /api/feed can return, with the SQL that reads each (any %s is the
+# viewer's id). Only public columns are listed; the author comes from a join
+# rather than a second query.
+FEED_POST_FIELDS = {
+    'id': "p.id", 'user_id': "p.user_id", 'title': "p.title", 'content': "p.content",
+    'category': "p.category", 'tags': "p.tags", 'date': "p.date", 'version': "p.version",
+    'image': "p.image", 'image_thumb': "p.image_thumb", 'image_card': "p.image_card",
+    'likes_count': "p.likes_count", 'dislikes_count': "p.dislikes_count", 'comments_count': "p.comments_count",
+    'user_liked': "EXISTS (SELECT 1 FROM `like` WHERE post_id = p.id AND user_id = %s)",
+    'user_disliked': "EXISTS (SELECT 1 FROM dislike WHERE post_id = p.id AND user_id = %s)",
+}
+FEED_USER_FIELDS = {
+    'id': "u.id", 'first_name': "u.first_name", 'last_name': "u.last_name",
+    'profile_picture': "u.profile_picture", 'profile_picture_thumb': "u.profile_picture_thumb",
+    'version': "u.version",
+}
+FEED_API_MAX_LIMIT = 100
+
+
+def parse_feed_fields(fields):
+    """Split a fields= list like "title,likes_count,user.first_name" into (post fields, user fields).
+
+    None or an empty string selects everything; unknown names raise ValueError.
+    """
+    names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+    if not names:
+        return list(FEED_POST_FIELDS), list(FEED_USER_FIELDS)
+    post_fields, user_fields = [], []
+    for name in names:
+        if name.startswith("user.") and name[5:] in FEED_USER_FIELDS:
+            user_fields.append(name[5:])
+        elif name in FEED_POST_FIELDS:
+            post_fields.append(name)
+        else:
+            raise ValueError(f"Unknown field: {name}")
+    return post_fields, user_fields
+
+
+def _post_item_columns(viewer_id, post_fields=None, user_fields=None):
+    """SELECT list, its parameters and a row -> {'post': {...}, 'user': {...}} builder.
+
+    For queries over post p JOIN user u; all fields by default.
+    """
+    post_fields = post_fields if post_fields is not None else list(FEED_POST_FIELDS)
+    user_fields = user_fields if user_fields is not None else list(FEED_USER_FIELDS)
+    columns = []
+    params = []
+    for name in post_fields:
+        expression = FEED_POST_FIELDS[name]
+        params += [viewer_id] * expression.count("%s")
+        columns.append(f"{expression} AS post_{name}")
+    columns += [f"{FEED_USER_FIELDS[name]} AS user_{name}" for name in user_fields]
+
+    def build(row):
+        post = {name: row[f"post_{name}"] for name in post_fields}
+        for flag in ('user_liked', 'user_disliked'):
+            if flag in post:
+                post[flag] = bool(post[flag])
+        return {'post': post, 'user': {name: row[f"user_{name}"] for name in user_fields}}
+
+    return ", ".join(columns), params, build
+
+
+def stream_feed(viewer_id, cursor=None, limit=FEED_PAGE_SIZE, friends=False, post_fields=None, user_fields=None):
+    """One feed page as a LazyPage of {'post': {...}, 'user': {...}} items with just the requested fields.
+
+    Pages are keyed on (date, id) so each request reads only `limit` rows no
+    matter how deep the reader scrolls: off the post(drafts, date, id) index
+    for the home feed, or with `friends` off the viewer's materialized
+    timeline rows (filled in at post time by _fan_out_post). Nothing is
+    hydrated afterwards: a single query joins each post's author and the
+    viewer's reactions, and its rows are turned into items as they come off
+    the cursor.
+    """
+    columns, params, build = _post_item_columns(viewer_id, post_fields, user_fields)
+    scan, scan_params = _feed_scan(viewer_id, cursor, friends, join="JOIN user u ON u.id = p.user_id")
+    rows = _stream_rows(
+        f"SELECT p.date AS cursor_date, p.id AS cursor_id, {columns} {scan} LIMIT %s",
+        params + scan_params + [limit + 1]
+    )
+    return LazyPage(rows, limit, key=lambda row: (row['cursor_date'], row['cursor_id']), build=build)
+
+
+def stream_search_posts(viewer_id, query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """search_posts() as a LazyPage of feed items, each joined to its author and the viewer's reactions."""
+    terms = _fulltext_query(query)
+    if not terms:
+        return LazyPage(iter(()), limit)
+    columns, params, build = _post_item_columns(viewer_id)
+    rows = _stream_rows(
+        f"""SELECT {columns}
+            FROM post p JOIN user u ON u.id = p.user_id
+            WHERE MATCH(p.title, p.content) AGAINST (%s IN BOOLEAN MODE) AND p.drafts = FALSE
+            ORDER BY MATCH(p.title, p.content) AGAINST (%s IN BOOLEAN MODE) DESC, p.date DESC
+            LIMIT %s OFFSET %s""",
+        params + [terms, terms, limit + 1, offset]
+    )
+    return LazyPage(rows, limit, build=build)
+
+
+def stream_search_users(query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """search_users() as a LazyPage; nothing is queried until it is iterated."""
+    terms = _fulltext_query(query)
+    if not terms:
+        return LazyPage(iter(()), limit)
+    rows = _stream_rows(
+        """SELECT * FROM user
+           WHERE MATCH(first_name, last_name, email) AGAINST (%s IN BOOLEAN MODE)
+           ORDER BY MATCH(first_name, last_name, email) AGAINST (%s IN BOOLEAN MODE) DESC, first_name, last_name
+           LIMIT %s OFFSET %s""",
+        (terms, terms, limit + 1, offset)
+    )
+    return LazyPage(rows, limit)
+
+
+def stream_people_page(viewer_id, cursor=None, limit=PEOPLE_PAGE_SIZE):
+    """One page of the user directory with the viewer's relationship and mutual friends, as a LazyPage.
+
+    Nothing is queried until it is first iterated (see _people_rows()); the
+    page is then read whole (it is small) so its mutual friends' names can be
+    loaded in one more query before the first row is handed out.
+    """
+    def rows():
+        users = _people_rows(viewer_id, cursor, limit)
+        attach_mutual_friends(viewer_id, users[:limit])
+        yield from users
+
+    return LazyPage(rows(), limit, key=lambda user: (user['first_name'], user['last_name'], user['id']))
+
+
+# ------------------------------
+# Version stamps (for ETags)
+# ------------------------------
+# Each returns a small value that changes whenever the corresponding page
+# would render differently, read with one indexed query and no hydration.
+def get_feed_stamp(viewer_id, cursor=None, friends=False, limit=FEED_PAGE_SIZE):
+    """(id, version, author version) of every post on a feed page, plus one to detect a next page."""
+    scan, params = _feed_scan(viewer_id, cursor, friends)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""SELECT p.id, p.version, (SELECT version FROM user WHERE id = p.user_id) AS author_version
+            {scan} LIMIT %s""",
+        params + [limit + 1]
+    )
+    stamp = [(r['id'], r['version'], r['author_version']) for r in cursor.fetchall()]
+    conn.close()
+    return stamp
+
+
+def get_post_stamp(post_id, cursor=None, limit=COMMENT_PAGE_SIZE, replies_limit=REPLY_PAGE_SIZE):
+    """(post version, author version, commenter versions), or None if the post doesn't exist.
+
+    The post's version moves with reactions, comments, replies and comment
+    likes. The commenters' versions are summed over the comment page at
+    `cursor` and its inline replies only (the rows get_comment_tree() shows),
+    so a renamed commenter changes the stamp without reading the whole thread.
+    """
+    scan, scan_params = _comment_page_scan(post_id, cursor)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""SELECT p.version, u.version AS author_version,
+                   (SELECT COALESCE(SUM(cu.version), 0)
+                    FROM (SELECT user_id {scan} LIMIT %s) c JOIN user cu ON cu.id = c.user_id
+                   ) AS commenter_versions,
+                   (SELECT COALESCE(SUM(ru.version), 0)
+                    FROM (
+                        SELECT user_id, ROW_NUMBER() OVER (PARTITION BY comment_id ORDER BY date, id) AS position
+                        FROM reply_comment
+                        WHERE comment_id IN (SELECT id FROM (SELECT id {scan} LIMIT %s) page)
+                    ) r JOIN user ru ON ru.id = r.user_id
+                    WHERE r.position <= %s
+                   ) AS replier_versions
+            FROM post p JOIN user u ON u.id = p.user_id WHERE p.id = %s""",
+        scan_params + [limit] + scan_params + [limit, replies_limit, post_id]
+    )
+    row = cursor.fetchone()
+    conn.close()
+    if not row:
+        return None
+    return (row['version'], row['author_version'], int(row['commenter_versions']), int(row['replier_versions']))
+
+
+def get_profile_stamp(viewer_id, user_id, cursor=None, limit=PROFILE_PAGE_SIZE):
+    """The profile owner's version, the viewer's relationship, the shown posts and the mutual friends.
+
+    Only the page of posts at `cursor` is read (the rows
+    get_profile_posts_page() shows, plus one to detect a next page).
+    Returns None if the user doesn't exist.
+    """
+    scan, params = _user_posts_scan(user_id, cursor, include_drafts=(user_id == viewer_id))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT u.version,
+                  (SELECT COUNT(*) FROM friendship WHERE user1_id = %s AND user2_id = u.id) AS friends,
+                  (SELECT COALESCE(SUM(CASE WHEN sender_id = u.id THEN 1 ELSE 2 END), 0)
+                   FROM friend_request
+                   WHERE status = 'pending'
+                     AND ((sender_id = u.id AND receiver_id = %s) OR (sender_id = %s AND receiver_id = u.id))
+                  ) AS requests
+           FROM user u WHERE u.id = %s""",
+        (viewer_id, viewer_id, viewer_id, user_id)
+    )
+    row = cursor.fetchone()
+    if not row:
+        conn.close()
+        return None
+    cursor.execute(f"SELECT id, version {scan} LIMIT %s", params + [limit + 1])
+    posts = tuple((r['id'], r['version']) for r in cursor.fetchall())
+
+    # Mutual friends come from the in-memory graph, not the database; the
+    # versions of the ones named on the page cover their names and avatars
+    friend_graph.ensure_current()
+    mutual = friend_graph.mutual_friends(viewer_id, [user_id])[user_id]
+    shown_ids = list(mutual[:MUTUAL_NAMES_SHOWN])
+    shown_versions = ()
+    if shown_ids:
+        cursor.execute(
+            f"SELECT id, version FROM user WHERE id IN ({_placeholders(shown_ids)}) ORDER BY id", shown_ids
+        )
+        shown_versions = tuple(r['version'] for r in cursor.fetchall())
+    conn.close()
+    return tuple(row.values()) + posts + mutual + shown_versions
+
+
+def _people_rows(viewer_id, cursor, limit):
+    """Up to limit + 1 directory rows after `cursor`, with the viewer's relationship to each.
+
+    A single query orders users by (first_name, last_name, id) off the name
+    index and LEFT JOINs friendship and pending friend_request rows to fill in
+    is_friend, has_pending_request (they asked the viewer) and
+    has_sent_request (the viewer asked them).
+    """
+    where = "u.id <> %s"
+    params = [viewer_id]
+    key = decode_cursor(cursor)
+    if key and len(key) == 3:
+        first, last, last_id = key
+        where += """ AND (u.first_name > %s
+                     OR (u.first_name = %s AND (u.last_name > %s
+                     OR (u.last_name = %s AND u.id > %s))))"""
+        params += [first, first, last, last, last_id]
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""SELECT u.*,
+                   f.id IS NOT NULL AS is_friend,
+                   fr_in.id IS NOT NULL AS has_pending_request,
+                   fr_out.id IS NOT NULL AS has_sent_request
+            FROM user u
+            LEFT JOIN friendship f
+                   ON f.user1_id = %s AND f.user2_id = u.id
+            LEFT JOIN friend_request fr_in
+                   ON fr_in.sender_id = u.id AND fr_in.receiver_id = %s AND fr_in.status = 'pending'
+            LEFT JOIN friend_request fr_out
+                   ON fr_out.sender_id = %s AND fr_out.receiver_id = u.id AND fr_out.status = 'pending'
+            WHERE {where}
+            ORDER BY u.first_name, u.last_name, u.id
+            LIMIT %s""",
+        [viewer_id, viewer_id, viewer_id] + params + [limit + 1]
+    )
+    users = cursor.fetchall()
+    conn.close()
+
+    for user in users:
+        for flag in ('is_friend', 'has_pending_request', 'has_sent_request'):
+            user[flag] = bool(user[flag])
+    return users
+
+
+def suggest_friends(viewer_id, limit=SUGGESTION_COUNT):
+    """People you may know: non-friends ranked by mutual friends, each with a mutual_count.
+
+    The ranking comes from the in-memory friend_graph; one query then loads
+    the candidates' rows, leaving out anyone with a pending request either way.
+    """
+    friend_graph.ensure_current()
+    # Over-fetch a little so pending requests can be dropped without a second pass
+    ranked = friend_graph.suggestions(viewer_id, limit * 2)
+    if not ranked:
+        return []
+    mutual_counts = dict(ranked)
+    candidate_ids = list(mutual_counts)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""SELECT u.* FROM user u
+            WHERE u.id IN ({_placeholders(candidate_ids)})
+              AND NOT EXISTS (SELECT 1 FROM friend_request fr
+                              WHERE fr.status = 'pending'
+                                AND ((fr.sender_id = %s AND fr.receiver_id = u.id)
+                                  OR (fr.sender_id = u.id AND fr.receiver_id = %s)))""",
+        candidate_ids + [viewer_id, viewer_id]
+    )
+    users = cursor.fetchall()
+    conn.close()
+
+    for user in users:
+        user['mutual_count'] = mutual_counts[user['id']]
+    users.sort(key=lambda user: (-user['mutual_count'], user['id']))
+    return users[:limit]
+
+
+def attach_mutual_friends(viewer_id, users):
+    """Fill in mutual_count and the first few mutual_friends (user rows) on each of `users`.
+
+    Counts for the whole page come from one pass over the in-memory friend
+    graph; the names shown are then loaded in a single query.
+    """
+    friend_graph.ensure_current()
+    mutual = friend_graph.mutual_friends(viewer_id, [user['id'] for user in users])
+    shown_ids = [friend_id for user in users for friend_id in mutual[user['id']][:MUTUAL_NAMES_SHOWN]]
+
+    shown = {}
+    if shown_ids:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        shown = _users_by_id(cursor, shown_ids)
+        conn.close()
+
+    for user in users:
+        ids = mutual[user['id']]
+        user['mutual_count'] = len(ids)
+        user['mutual_friends'] = [shown[i] for i in ids[:MUTUAL_NAMES_SHOWN] if i in shown]
+    return users
+
+
+# ------------------------------
+# Comment threads
+# ------------------------------
+def _users_by_id(cursor, user_ids):
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return {}
+    cursor.execute(f"SELECT * FROM user WHERE id IN ({_placeholders(user_ids)})", user_ids)
+    return {u['id']: u for u in cursor.fetchall()}
+
+
+def _after_date_id(cursor_token, prefix=""):
+    """SQL fragment and params for rows after a (date, id) cursor, oldest first."""
+    key = _date_id_key(cursor_token)
+    if not key:
+        return "", []
+    return (f" AND ({prefix}date > %s OR ({prefix}date = %s AND {prefix}id > %s))",
+            [key[0], key[0], key[1]])
+
+
+def _comment_page_scan(post_id, cursor):
+    """FROM ... ORDER BY of a post's top-level comments after a (date, id) cursor and its parameters.
+
+    Shared by get_comment_tree() and get_post_stamp() so both read the same rows.
+    """
+    after, params = _after_date_id(cursor)
+    return f"FROM comment WHERE post_id=%s{after} ORDER BY date, id", [post_id] + params
+
+
+def get_comment_tree(post_id, cursor=None, limit=COMMENT_PAGE_SIZE, replies_limit=REPLY_PAGE_SIZE):
+    """One page of a post's top-level comments with their first replies.
+
+    Uses four queries whatever the page holds: the comment page (oldest
+    first, keyed on (date, id)), the first `replies_limit` replies of every
+    comment on it (one windowed query), all authors, and comment_like counts.
+    Each comment gets 'user', 'likes_count', 'replies' and 'replies_cursor'
+    (set when it has more replies; see get_comment_replies()).
+    `replies_limit` must be at least 1, or ValueError is raised.
+    Returns (comments, next_cursor).
+    """
+    if replies_limit < 1:
+        raise ValueError("replies_limit must be at least 1")
+    scan, params = _comment_page_scan(post_id, cursor)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * {scan} LIMIT %s", params + [limit + 1])
+    comments = cursor.fetchall()
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1]['date'], comments[-1]['id'])
+    if not comments:
+        conn.close()
+        return [], None
+
+    comment_ids = [c['id'] for c in comments]
+    in_comments = _placeholders(comment_ids)
+
+    # One extra reply per comment tells us whether a "more replies" link is needed
+    cursor.execute(
+        f"""SELECT * FROM (
+                SELECT r.*, ROW_NUMBER() OVER (PARTITION BY comment_id ORDER BY date, id) AS position
+                FROM reply_comment r WHERE comment_id IN ({in_comments})
+            ) ranked
+            WHERE position <= %s
+            ORDER BY comment_id, date, id""",
+        comment_ids + [replies_limit + 1]
+    )
+    replies = cursor.fetchall()
+
+    cursor.execute(
+        f"""SELECT comment_id, COUNT(*) AS count FROM comment_like
+            WHERE comment_id IN ({in_comments}) GROUP BY comment_id""",
+        comment_ids
+    )
+    likes = {r['comment_id']: r['count'] for r in cursor.fetchall()}
+
+    users = _users_by_id(cursor, [c['user_id'] for c in comments] + [r['user_id'] for r in replies])
+    conn.close()
+
+    by_comment = {}
+    for reply in replies:
+        reply['user'] = users.get(reply['user_id'])
+        by_comment.setdefault(reply['comment_id'], []).append(reply)
+
+    for comment in comments:
+        comment['user'] = users.get(comment['user_id'])
+        comment['likes_count'] = likes.get(comment['id'], 0)
+        thread = by_comment.get(comment['id'], [])
+        comment['replies'] = thread[:replies_limit]
+        comment['replies_cursor'] = None
+        if len(thread) > replies_limit:
+            last = comment['replies'][-1]
+            comment['replies_cursor'] = encode_cursor(last['date'], last['id'])
+    return comments, next_cursor
+
+
+def get_comment_replies(comment_id, cursor=None, limit=COMMENT_PAGE_SIZE):
+    """A page of replies to one comment (oldest first) with their authors.
+
+    Returns (replies, next_cursor).
+    """
+    after, params = _after_date_id(cursor)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT * FROM reply_comment WHERE comment_id=%s{after} ORDER BY date, id LIMIT %s",
+        [comment_id] + params + [limit + 1]
+    )
+    replies = cursor.fetchall()
+    next_cursor = None
+    if len(replies) > limit:
+        replies = replies[:limit]
+        next_cursor = encode_cursor(replies[-1]['date'], replies[-1]['id'])
+    users = _users_by_id(cursor, [r['user_id'] for r in replies])
+    conn.close()
+
+    for reply in replies:
+        reply['user'] = users.get(reply['user_id'])
+    return replies, next_cursor
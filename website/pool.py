@@ -0,0 +1,122 @@
+import queue
+import threading
+import time
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class PooledConnection:
+    """Thin proxy around a DB-API connection checked out of a ConnectionPool.
+
+    Everything except close() is forwarded to the real connection. close()
+    hands the connection back to the pool instead of tearing it down, unless
+    the connection belongs to the current request, in which case it stays
+    checked out until the request ends.
+    """
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        self._released = False
+        self.request_scoped = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._conn.cursor(*args, **kwargs)
+        if self._pool.wrap_cursor:
+            cursor = self._pool.wrap_cursor(cursor)
+        return cursor
+
+    def close(self):
+        if not self.request_scoped:
+            self.release()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of database connections.
+
+    - at most `size` connections are checked out at once; further callers
+      wait up to `timeout` seconds and then get PoolExhausted
+    - idle connections older than `recycle` seconds are closed and replaced
+    - with `pre_ping`, an idle connection is health-checked before reuse so
+      connections the server has dropped are never handed out
+    - `wrap_cursor`, if given, is applied to every cursor handed out
+      (used for query profiling)
+    """
+
+    def __init__(self, connect, size=10, recycle=3600, timeout=30, pre_ping=True, wrap_cursor=None):
+        self._connect = connect
+        self.wrap_cursor = wrap_cursor
+        self.size = size
+        self.recycle = recycle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhausted(f"No database connection available after {self.timeout}s")
+        try:
+            while True:
+                try:
+                    conn, created_at = self._idle.get_nowait()
+                except queue.Empty:
+                    return PooledConnection(self, self._connect(), time.monotonic())
+
+                if time.monotonic() - created_at > self.recycle or (self.pre_ping and not self._ping(conn)):
+                    self._discard(conn)
+                    continue
+                return PooledConnection(self, conn, created_at)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, pooled):
+        conn = pooled._conn
+        try:
+            # End whatever transaction is still open so the next borrower
+            # starts from a fresh snapshot instead of this request's
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, pooled._created_at))
+        finally:
+            self._slots.release()
+
+    def close_idle(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,154 @@
+"""
+Per-request SQL profiling.
+
+Every cursor handed out by the connection pool is wrapped so each execute()
+is timed and recorded against the current request. After the request the
+totals are sent back as `X-DB-Queries` / `Server-Timing` headers and kept in a
+small ring buffer shown at /debug/requests. Statements that run many times in
+one request (the usual N+1 shape) are flagged, and a request that runs more
+queries than its budget is logged, or fails outright when SQL_BUDGET_STRICT
+is set (useful in tests).
+
+Streamed pages run most of their queries after the headers have gone out, so
+their headers only count the queries before the body; the full count is in
+/debug/requests (and last_request()) and their budget is checked once the
+stream has finished.
+"""
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import current_app, g, has_app_context, request
+
+RECENT_REQUESTS = deque(maxlen=200)
+_local = threading.local()
+DEFAULT_REPEAT_THRESHOLD = 5
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a route runs more queries than allowed."""
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+
+    def record(self, sql, elapsed):
+        self.queries += 1
+        self.total_time += elapsed
+        self.statements[" ".join(sql.split())] += 1
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """Statements run at least `threshold` times, most frequent first."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+class ProfiledCursor:
+    """Wraps a DB-API cursor and records each statement on the request profile."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, sql, args):
+        started = time.perf_counter()
+        try:
+            return method(sql, args) if args is not None else method(sql)
+        finally:
+            profile = g.get('sql_profile') if has_app_context() else None
+            if profile is not None:
+                profile.record(sql, time.perf_counter() - started)
+
+    def execute(self, sql, args=None):
+        return self._timed(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, args):
+        return self._timed(self._cursor.executemany, sql, args)
+
+
+def query_budget(limit):
+    """Decorator capping how many queries a view may run per request."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def _budget_for_request():
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'query_budget', current_app.config.get('SQL_QUERY_BUDGET'))
+
+
+def _check_budget(app, profile):
+    budget = _budget_for_request()
+    if budget is not None and profile.queries > budget:
+        message = f"{request.method} {request.path} ran {profile.queries} queries (budget {budget})"
+        if app.config['SQL_BUDGET_STRICT']:
+            raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
+
+
+def last_request():
+    """The profile record of the last request finished on this thread (None before the first)."""
+    return getattr(_local, 'last', None)
+
+
+def _normalise_in_lists(sql):
+    # "IN (%s, %s, %s)" and "IN (%s)" are the same query pattern
+    return re.sub(r"IN \((?:%s, )*%s\)", "IN (…)", sql)
+
+
+def init_profiler(app):
+    app.config.setdefault('SQL_QUERY_BUDGET', None)
+    app.config.setdefault('SQL_BUDGET_STRICT', False)
+    app.config.setdefault('SQL_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+
+    @app.before_request
+    def start_sql_profile():
+        g.sql_profile = RequestProfile()
+
+    @app.after_request
+    def report_sql_profile(response):
+        profile = g.get('sql_profile')
+        if profile is None:
+            return response
+        response.headers['X-DB-Queries'] = str(profile.queries)
+        response.headers['Server-Timing'] = f"db;desc=\"{profile.queries} queries\";dur={profile.total_time * 1000:.1f}"
+
+        if response.is_streamed:
+            g.sql_streamed = True
+        else:
+            _check_budget(app, profile)
+        return response
+
+    @app.teardown_request
+    def store_sql_profile(exception=None):
+        profile = g.pop('sql_profile', None)
+        if profile is None or request.endpoint == 'static':
+            return
+        if g.pop('sql_streamed', False):
+            _check_budget(app, profile)
+        patterns = Counter()
+        for sql, n in profile.statements.items():
+            patterns[_normalise_in_lists(sql)] += n
+        RECENT_REQUESTS.appendleft({
+            'method': request.method,
+            # The URL rule, not the path: arguments and query strings (search
+            # terms, profile ids, cursors) aren't kept for other users to see
+            'path': request.url_rule.rule if request.url_rule else request.path,
+            'endpoint': request.endpoint,
+            'queries': profile.queries,
+            'db_ms': profile.total_time * 1000,
+            'repeated': [(sql, n) for sql, n in patterns.most_common()
+                         if n >= app.config['SQL_REPEAT_THRESHOLD']],
+            'error': repr(exception) if exception else None,
+        })
+        _local.last = RECENT_REQUESTS[0]
@@ -0,0 +1,39 @@
+// Infinite scroll for the home feed.
+// The server renders a plain "Load more" link pointing at the next cursor page;
+// when it scrolls into view we fetch that page and append its posts in place,
+// so the feed still works page by page with JavaScript disabled.
+(function () {
+  var feed = document.getElementById("feed");
+  var link = document.getElementById("load-more");
+  if (!feed || !link || !("IntersectionObserver" in window)) {
+    return;
+  }
+
+  var loading = false;
+  var observer = new IntersectionObserver(function (entries) {
+    if (!entries[0].isIntersecting || loading) {
+      return;
+    }
+    loading = true;
+    fetch(link.href, { credentials: "same-origin" })
+      .then(function (response) { return response.text(); })
+      .then(function (html) {
+        var page = new DOMParser().parseFromString(html, "text/html");
+        page.querySelectorAll("#feed > .feed-item").forEach(function (item) {
+          feed.appendChild(item);
+        });
+        var next = page.getElementById("load-more");
+        if (next) {
+          link.href = next.href;
+          loading = false;
+        } else {
+          observer.disconnect();
+          link.parentNode.removeChild(link);
+        }
+      })
+      .catch(function () {
+        loading = false;
+      });
+  });
+  observer.observe(link);
+})();
@@ -1,17 +1,112 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from flask import (
+    Blueprint, render_template, request, redirect, url_for, flash, jsonify, get_template_attribute,
+    send_from_directory, make_response, session, current_app, g, Response, stream_with_context,
+    stream_template, get_flashed_messages, abort
+)
 from flask_login import login_required, current_user, logout_user
 from .models import (
-    get_user_by_id, get_user_posts, create_post, create_post_with_image,
-    get_post_by_id, get_post_comments,
+    get_user_by_id, get_profile_posts_page, get_relationship_status, attach_mutual_friends,
+    create_post, create_post_with_image,
+    get_post_by_id, get_comment_by_id, get_comment_tree, get_comment_replies,
     add_comment, reply_to_comment,
-    like_post, dislike_post, like_comment,
-    get_post_likes, get_post_dislikes, get_post_comments_count,
-    user_liked_post, user_disliked_post, remove_like, remove_dislike,
-    get_all_posts, update_user
+    like_comment, toggle_reaction,
+    get_all_posts, hydrate_posts, update_user, SEARCH_PAGE_SIZE,
+    release_media, set_profile_picture, get_feed_stamp, get_post_stamp, get_profile_stamp,
+    accept_friend_requests, reject_friend_requests, cancel_friend_requests,
+    stream_feed, parse_feed_fields, FEED_PAGE_SIZE, FEED_API_MAX_LIMIT,
+    stream_search_posts, stream_search_users, stream_people_page, LazyPage
+)
+
+from . import media
+from .media import (
+    UploadTooLarge,
+    allowed_file, process_post_image, process_profile_picture, save_upload
 )
+from .profiler import query_budget
 
 views = Blueprint('views', __name__)
 
+
+def render_post_cards(items, variant):
+    """Attach the cached, viewer-independent HTML of each post card as item['fragment'].
+
+    `variant` names a macro in _post_cards.html. The cache key includes the
+    post's and author's version stamps, which bump on edits, reactions and
+    comments, so a changed post is simply rendered under a new key. It also
+    starts with ETAG_SALT, so cards rendered by an older template (perhaps by
+    another worker, through a shared store) are not served after a deploy.
+    """
+    from .cache import fragment_cache
+    macro = get_template_attribute("_post_cards.html", variant)
+    salt = current_app.config['ETAG_SALT']
+    for item in items:
+        post, author = item['post'], item['user']
+        key = f"{salt}:{variant}:{post['id']}:v{post['version']}:u{author['id']}:v{author['version']}"
+        item['fragment'] = fragment_cache.get_or_render(key, lambda: macro(item))
+    return items
+
+
+def stream_post_cards(items, variant):
+    """render_post_cards() one item at a time, for pages rendered while their rows are read."""
+    for item in items:
+        yield render_post_cards([item], variant)[0]
+
+
+def stream_page(template, **context):
+    """Render `template` as a stream, so the top of the page is sent before the queries behind it run.
+
+    Pass LazyPages (or other generators) for the long lists; a LazyPage's
+    next_cursor/has_more can be read in the template after its loop. The
+    session is saved when the headers go out, before the body is rendered,
+    so pending flash messages are taken out of it here (the template still
+    gets them).
+    """
+    get_flashed_messages()
+    return stream_template(template, **context)
+
+# ------------------------------
+# Conditional GET
+# ------------------------------
+# Pages are per viewer, so they are sent "private, no-cache": browsers keep a
+# copy but revalidate it, and a matching If-None-Match gets an empty 304 after
+# a single stamp query instead of a full hydrate-and-render.
+def page_etag(*stamp):
+    """ETag from a page's version stamps, the URL and the viewer's own version (the navbar shows them)."""
+    raw = repr((current_app.config.get('ETAG_SALT'), request.full_path,
+                current_user.id, current_user.version) + stamp)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def not_modified(etag):
+    """A 304 if the client already holds this page, else None.
+
+    Never while a flash message is waiting, because it has to be rendered
+    (and rendering consumes it, so remember that for with_etag()).
+    """
+    g.flashing = '_flashes' in session
+    if not etag or g.flashing or etag not in request.if_none_match:
+        return None
+    return _revalidate(make_response("", 304), etag)
+
+
+def with_etag(response, etag):
+    # A page that just showed flash messages must not be reused later
+    if not etag or g.get('flashing'):
+        return response
+    return _revalidate(make_response(response), etag)
+
+
+def _revalidate(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 # Month mapping for user join dates
 months = {
     1: "January", 2: "February", 3: "March", 4: "April",
@@ -23,6 +118,7 @@ months = {
 # ---------------- HOME PAGE ----------------
 @views.route("/home/", methods=["GET", "POST"])
 @login_required
+@query_budget(10)
 def home():
     if request.method == "POST":
         search_term = request.form.get("search", "").strip()
@@ -31,35 +127,68 @@ def home():
         else:
             flash("Please enter a search term.", category="error")
 
-    posts = []
-    # Get all posts, not just current user's posts
-    all_posts = get_all_posts()
-    print(f"DEBUG HOME: Found {len(all_posts)} posts in database")
-    
-    for p in all_posts:
-        print(f"DEBUG HOME: Processing post ID {p['id']}: {p['title']}")
-        user = get_user_by_id(p['user_id'])
-        if user:  # Only add posts where user exists
-            # Add like/dislike/comment data
-            p['likes_count'] = get_post_likes(p['id'])
-            p['dislikes_count'] = get_post_dislikes(p['id'])
-            p['comments_count'] = get_post_comments_count(p['id'])
-            p['user_liked'] = user_liked_post(current_user.id, p['id'])
-            p['user_disliked'] = user_disliked_post(current_user.id, p['id'])
-            posts.append({'post': p, 'user': user})
-        else:
-            print(f"DEBUG HOME: Skipping post {p['id']} - user not found")
-
-    response = render_template("home.html", user=current_user, page="Home", posts=posts)
-    # Add cache control headers to prevent caching
-    from flask import make_response
-    response = make_response(response)
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    feed = "friends" if request.args.get("feed") == "friends" else None
+    cursor = request.args.get("cursor")
+    etag = page_etag(*get_feed_stamp(current_user.id, cursor, friends=bool(feed)))
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
+    # One page of everyone's posts (or just friends'), each joined to its author, read as it's rendered
+    pager = stream_feed(current_user.id, cursor, friends=bool(feed))
+    posts = stream_post_cards(pager, "home_card")
 
+    response = stream_page("home.html", user=current_user, page="Home", posts=posts, pager=pager, feed=feed)
+    return with_etag(response, etag)
+
+
+# ---------------- FEED API ----------------
+# Image columns in API items, and the static folder their legacy filenames live in
+API_IMAGE_FIELDS = {
+    'post': {'image': media.POST_FOLDER, 'image_thumb': media.POST_FOLDER, 'image_card': media.POST_FOLDER},
+    'user': {'profile_picture': media.AVATAR_FOLDER, 'profile_picture_thumb': media.AVATAR_FOLDER},
+}
+
+
+def _api_item(item):
+    """An item from stream_feed() with dates in ISO format and image names turned into URLs."""
+    for part, images in API_IMAGE_FIELDS.items():
+        values = item[part]
+        for field, folder in images.items():
+            if values.get(field):
+                values[field] = media.image_url(folder, values[field])
+        for field, value in values.items():
+            if isinstance(value, datetime):
+                values[field] = value.isoformat()
+    return item
+
+
+@views.route("/api/feed")
+@login_required
+@query_budget(5)
+def api_feed():
+    """One page of the feed as newline-delimited JSON, streamed as rows are read.
+
+    Query parameters: feed=friends, cursor (from the previous page), limit
+    (at most FEED_API_MAX_LIMIT) and fields (e.g. "id,title,user.first_name").
+    Each line is {"post": {...}, "user": {...}}; the last is {"next_cursor": ...}.
+    """
+    try:
+        post_fields, user_fields = parse_feed_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    limit = max(1, min(request.args.get("limit", FEED_PAGE_SIZE, type=int), FEED_API_MAX_LIMIT))
+
+    page = stream_feed(current_user.id, request.args.get("cursor"), limit,
+                       friends=request.args.get("feed") == "friends",
+                       post_fields=post_fields, user_fields=user_fields)
+
+    def generate():
+        for item in page:
+            yield json.dumps(_api_item(item)) + "\n"
+        yield json.dumps({'next_cursor': page.next_cursor}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 
 # ---------------- PROFILE ----------------
@@ -71,16 +200,23 @@ def profile_redirect():
 
 @views.route("/profile/<int:id>")
 @login_required
+@query_budget(10)
 def user_profile(id):
-    from .models import are_friends, get_pending_friend_requests, get_sent_friend_requests
-    
+    cursor = request.args.get("cursor")
+    stamp = get_profile_stamp(current_user.id, id, cursor)
+    etag = page_etag(*stamp) if stamp else None
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     user = get_user_by_id(id)
     if not user:
         flash("User not found.", category="error")
         return redirect(url_for("views.home"))
 
-    posts_raw = get_user_posts(id)[:5]
-    posts = [{'post': p, 'user': user} for p in posts_raw]
+    # One page of posts (drafts only on your own profile)
+    posts_raw, next_cursor = get_profile_posts_page(id, current_user.id, cursor)
+    posts = render_post_cards([{'post': p, 'user': user} for p in posts_raw], "profile_card")
 
     name = f"{user['first_name']} {user['last_name']}"
     pagename = f"{name}'s Profile"
@@ -91,17 +227,14 @@ def user_profile(id):
     month = months.get(int(m))
     formatted_date = f"{month} {d}, {y}"
 
-    # Check friendship status
-    is_friend = are_friends(current_user.id, id) if id != current_user.id else False
-    
-    # Check if there's a pending request
-    pending_requests = get_pending_friend_requests(current_user.id)
-    sent_requests = get_sent_friend_requests(current_user.id)
-    
-    has_pending_request = any(req['sender_id'] == id for req in pending_requests)
-    has_sent_request = any(req['receiver_id'] == id for req in sent_requests)
+    # Friendship and pending requests either way, in one query
+    if id != current_user.id:
+        relationship = get_relationship_status(current_user.id, id)
+        attach_mutual_friends(current_user.id, [user])
+    else:
+        relationship = {'is_friend': False, 'has_pending_request': False, 'has_sent_request': False}
 
-    return render_template(
+    response = render_template(
         "profile.html",
         page=pagename,
         profile_user=user,
@@ -109,10 +242,11 @@ def user_profile(id):
         id=id,
         date_joined=formatted_date,
         posts=posts,
-        is_friend=is_friend,
-        has_pending_request=has_pending_request,
-        has_sent_request=has_sent_request
+        next_cursor=next_cursor,
+        is_first_page=not cursor,
+        **relationship
     )
+    return with_etag(response, etag)
 
 
 # ---------------- EDIT PROFILE ----------------
@@ -193,36 +327,20 @@ def edit_profile_picture(id):
         if 'profile_picture' in request.files:
             file = request.files['profile_picture']
             if file and file.filename != '':
-                from werkzeug.utils import secure_filename
-                import os
-                
-                # Check if file is allowed
-                def allowed_file(filename):
-                    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-                    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-                
                 if allowed_file(file.filename):
-                    # Create profile pictures directory if it doesn't exist
-                    upload_folder = os.path.join('website', 'static', 'profile_pictures')
-                    os.makedirs(upload_folder, exist_ok=True)
-                    
-                    # Save the file
-                    filename = secure_filename(file.filename)
-                    # Add timestamp to avoid conflicts
-                    import time
-                    timestamp = str(int(time.time()))
-                    name, ext = os.path.splitext(filename)
-                    profile_picture_filename = f"{name}_{timestamp}{ext}"
-                    
-                    file_path = os.path.join(upload_folder, profile_picture_filename)
-                    file.save(file_path)
-                    
-                    # Update user's profile picture in database
-                    update_user(current_user.id, {'profile_picture': profile_picture_filename})
+                    try:
+                        profile_picture_filename = save_upload(file)
+                    except UploadTooLarge as e:
+                        flash(str(e), category='error')
+                        return redirect(request.url)
+
+                    # Serve the original until the thumbnail is ready
+                    set_profile_picture(current_user.id, profile_picture_filename)
+                    process_profile_picture(current_user.id, profile_picture_filename)
                     flash('Profile picture updated successfully!', category='success')
                     return redirect(url_for('views.user_profile', id=current_user.id))
                 else:
-                    flash('Invalid file type. Please upload PNG, JPG, JPEG, or GIF files only.', category='error')
+                    flash('Invalid file type. Please upload PNG, JPG, JPEG, GIF or WebP files only.', category='error')
             else:
                 flash('No file selected.', category='error')
     
@@ -237,7 +355,7 @@ def remove_profile_picture(id):
         return redirect(url_for("views.home"))
     
     # Reset to default profile picture
-    update_user(current_user.id, {'profile_picture': 'default_profile_photo.jpg'})
+    set_profile_picture(current_user.id, 'default_profile_photo.jpg')
     flash('Profile picture removed successfully!', category='success')
     return redirect(url_for('views.edit_profile_picture', id=current_user.id))
 
@@ -253,54 +371,62 @@ def create_post_route():
         tags = request.form.get('tags')
         is_draft = request.form.get('draft') is not None
         
-        # Handle image upload
+        # Handle image upload (streamed to disk; thumbnails are built in the background)
         image_filename = None
         if 'image' in request.files:
             file = request.files['image']
             print(f"DEBUG: File received: {file.filename}")
             if file and file.filename != '':
-                from werkzeug.utils import secure_filename
-                import os
-                
-                # Create uploads directory if it doesn't exist
-                upload_folder = os.path.join('website', 'static', 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                print(f"DEBUG: Upload folder: {upload_folder}")
-                
-                # Save the file
-                filename = secure_filename(file.filename)
-                # Add timestamp to avoid conflicts
-                import time
-                timestamp = str(int(time.time()))
-                name, ext = os.path.splitext(filename)
-                image_filename = f"{name}_{timestamp}{ext}"
-                
-                file_path = os.path.join(upload_folder, image_filename)
-                print(f"DEBUG: Saving file to: {file_path}")
-                file.save(file_path)
-                
-                # Check if file was saved
-                if os.path.exists(file_path):
-                    print(f"DEBUG: File saved successfully: {image_filename}")
-                else:
-                    print(f"DEBUG: File NOT saved!")
+                if not allowed_file(file.filename):
+                    flash('Invalid file type. Please upload PNG, JPG, JPEG, GIF or WebP files only.', category='error')
+                    return render_template('create_post.html', user=current_user)
+                try:
+                    image_filename = save_upload(file)
+                except UploadTooLarge as e:
+                    flash(str(e), category='error')
+                    return render_template('create_post.html', user=current_user)
+                print(f"DEBUG: File saved successfully: {image_filename}")
             else:
                 print("DEBUG: No file or empty filename")
         
         if not content:
+            if image_filename:
+                release_media(image_filename)
             flash('Post content cannot be empty', category='error')
         else:
             # Debug: Print what we're trying to save
             print(f"DEBUG: Saving post with image: {image_filename}")
             print(f"DEBUG: Title: {title}, Content: {content[:50]}...")
             
-            create_post_with_image(title, content, current_user.id, image_filename, category, tags, is_draft)
+            try:
+                post_id = create_post_with_image(title, content, current_user.id, image_filename, category, tags, is_draft)
+            except Exception:
+                if image_filename:
+                    release_media(image_filename)
+                raise
+            if image_filename:
+                process_post_image(post_id, image_filename)
             flash('Post created successfully!', category='success')
             return redirect(url_for('views.home'))
         
     return render_template('create_post.html', user=current_user)
 
 
+# Content-addressed uploads: a key's bytes never change, so browsers and CDNs
+# may keep them for a year without revalidating
+MEDIA_MAX_AGE = 365 * 24 * 3600
+
+
+@views.route('/media/<path:key>')
+def media_file(key):
+    # The hash in the filename is a strong validator
+    response = send_from_directory(media.MEDIA_ROOT, key, etag=os.path.basename(key),
+                                   max_age=MEDIA_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 # Debug route to check posts
 @views.route('/debug/posts')
 @login_required
@@ -325,11 +451,50 @@ def debug_posts():
     return output
 
 
-# Route to force refresh database connection
+# Debug route to check the logged-in user cache
+@views.route('/debug/cache')
+@login_required
+def debug_cache():
+    from .cache import user_cache
+    stats = user_cache.stats()
+    output = "<h2>User Cache</h2><a href='/home/'>← Back to Home</a><br><br>"
+    for key, value in stats.items():
+        output += f"<strong>{key}:</strong> {value:.2%}<br>" if key == 'hit_rate' else f"<strong>{key}:</strong> {value}<br>"
+
+    from .cache import fragment_cache
+    output += "<h2>Post Card Fragments</h2>"
+    for key, value in fragment_cache.stats().items():
+        output += f"<strong>{key}:</strong> {value:.2%}<br>" if key == 'hit_rate' else f"<strong>{key}:</strong> {value}<br>"
+    return output
+
+
+# Debug route showing how many queries recent requests ran
+@views.route('/debug/requests')
+@login_required
+def debug_requests():
+    # Other users' traffic: only in debug or test runs
+    if not (current_app.debug or current_app.testing):
+        abort(404)
+    from markupsafe import escape
+    from .profiler import RECENT_REQUESTS
+    output = f"<h2>Recent Requests ({len(RECENT_REQUESTS)})</h2>"
+    output += "<a href='/home/'>← Back to Home</a><br><br>"
+    output += "<table border='1' cellpadding='4' style='border-collapse: collapse;'>"
+    output += "<tr><th>Request</th><th>Queries</th><th>DB time</th><th>Repeated statements (possible N+1)</th></tr>"
+    for entry in list(RECENT_REQUESTS):
+        repeated = "<br>".join(f"{n}× <code>{escape(sql[:200])}</code>" for sql, n in entry['repeated'])
+        error = f"<br><small style='color: red;'>{escape(entry['error'])}</small>" if entry['error'] else ""
+        output += f"<tr><td>{entry['method']} {escape(entry['path'])}{error}</td>"
+        output += f"<td>{entry['queries']}</td><td>{entry['db_ms']:.1f} ms</td><td>{repeated}</td></tr>"
+    output += "</table>"
+    return output
+
+
+# Route to check the database from a fresh request
 @views.route('/debug/refresh')
 @login_required
 def debug_refresh():
-    # Force a fresh database connection
+    # Pooled connections are rolled back on release, so this sees the latest data
     from . import get_db_connection
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -358,8 +523,6 @@ def delete_post(id):
 @views.route("/search/<search>")
 @login_required
 def search(search=None):
-    from .models import search_posts, search_users
-
     if request.method == "POST":
         search = request.form.get("search", "").strip()
         if search:
@@ -372,118 +535,145 @@ def search(search=None):
         return render_template(
             'search.html',
             posts=[],
+            post_pager=LazyPage(iter(()), SEARCH_PAGE_SIZE),
             users=[],
             query="",
             user=current_user,
-            page="Search"
+            page="Search",
+            page_number=1
         )
 
-    posts_raw = search_posts(search)
-    posts = []
-    for p in posts_raw:
-        user = get_user_by_id(p['user_id'])
-        posts.append((p, user))
+    page = max(request.args.get("page", 1, type=int), 1)
+    offset = (page - 1) * SEARCH_PAGE_SIZE
 
-    users = search_users(search) if len(search) > 1 else []
-    
-    # Debug: Print search results
-    print(f"DEBUG SEARCH: Query='{search}', Found {len(users)} users, {len(posts)} posts")
+    # Both lists are queried as the template reaches them; each reads one
+    # extra row so the pager knows whether there is a next page
+    users = stream_search_users(search, offset=offset) if len(search) > 1 else []
+    posts = stream_search_posts(current_user.id, search, offset=offset)
 
-    return render_template(
+    return stream_page(
         'search.html',
-        posts=posts,
+        posts=stream_post_cards(posts, "search_card"),
+        post_pager=posts,
         users=users,
         query=search,
         user=current_user,
-        page="Search"
+        page="Search",
+        page_number=page
     )
 
 
 # ---------------- FIND PEOPLE ----------------
 @views.route("/find_people")
 @login_required
+@query_budget(10)
 def find_people():
-    from .models import get_all_users, are_friends, get_pending_friend_requests, get_sent_friend_requests
-    
-    # Get all users except current user
-    all_users = get_all_users()
-    users = [u for u in all_users if u['id'] != current_user.id]
-    
-    # Get friend request info
-    pending_requests = get_pending_friend_requests(current_user.id)
-    sent_requests = get_sent_friend_requests(current_user.id)
-    
-    # Add friendship status to each user
-    for user in users:
-        user['is_friend'] = are_friends(current_user.id, user['id'])
-        user['has_pending_request'] = any(req['sender_id'] == user['id'] for req in pending_requests)
-        user['has_sent_request'] = any(req['receiver_id'] == user['id'] for req in sent_requests)
-    
-    return render_template(
+    from .models import suggest_friends
+
+    # One page of everyone except the current user, with friendship status and
+    # mutual friends filled in, loaded once the template gets to it
+    pager = stream_people_page(current_user.id, request.args.get("cursor"))
+    is_first_page = not request.args.get("cursor")
+
+    def suggestions():
+        if is_first_page:
+            yield from suggest_friends(current_user.id)
+
+    return stream_page(
         'find_people.html',
-        users=users,
+        users=pager,
+        pager=pager,
+        suggestions=suggestions(),
         user=current_user,
-        page="Find People"
+        page="Find People",
+        is_first_page=is_first_page
     )
 
 
 # ---------------- POST REACTIONS ----------------
+def _reaction_response(state):
+    # Scripts asking for JSON get the new state and counts; forms get redirected back
+    if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
+        if state is None:
+            return jsonify(error="Post not found."), 404
+        return jsonify(state)
+    if state is None:
+        flash("Post not found.", category="error")
+    return redirect(request.referrer or url_for('views.home'))
+
+
 @views.route("/post/<int:post_id>/like", methods=["POST"])
 @login_required
 def like_post_route(post_id):
-    # Check if user already liked the post
-    if user_liked_post(current_user.id, post_id):
-        # Remove like
-        remove_like(current_user.id, post_id)
-    else:
-        # Remove dislike if exists, then add like
-        if user_disliked_post(current_user.id, post_id):
-            remove_dislike(current_user.id, post_id)
-        like_post(current_user.id, post_id)
-    
-    return redirect(request.referrer or url_for('views.home'))
+    # Like, unlike, or switch a dislike to a like in one transaction
+    return _reaction_response(toggle_reaction(current_user.id, post_id, "like"))
 
 
 @views.route("/post/<int:post_id>/dislike", methods=["POST"])
 @login_required
 def dislike_post_route(post_id):
-    # Check if user already disliked the post
-    if user_disliked_post(current_user.id, post_id):
-        # Remove dislike
-        remove_dislike(current_user.id, post_id)
-    else:
-        # Remove like if exists, then add dislike
-        if user_liked_post(current_user.id, post_id):
-            remove_like(current_user.id, post_id)
-        dislike_post(current_user.id, post_id)
-    
-    return redirect(request.referrer or url_for('views.home'))
+    # Dislike, un-dislike, or switch a like to a dislike in one transaction
+    return _reaction_response(toggle_reaction(current_user.id, post_id, "dislike"))
 
 
 # ---------------- POST DETAIL ----------------
 @views.route("/post/<int:id>")
 @login_required
+@query_budget(10)
 def view_post(id):
+    comments_cursor = request.args.get("comments")
+    stamp = get_post_stamp(id, comments_cursor)
+    etag = page_etag(*stamp) if stamp else None
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     post = get_post_by_id(id)
     if not post:
         flash("Post not found.", category="error")
         return redirect(url_for("views.home"))
     
-    user = get_user_by_id(post['user_id'])
-    comments = get_post_comments(id)
-    
-    # Add user info to each comment
-    for comment in comments:
-        comment['user'] = get_user_by_id(comment['user_id'])
-    
-    # Add like/dislike/comment data
-    post['likes_count'] = get_post_likes(post['id'])
-    post['dislikes_count'] = get_post_dislikes(post['id'])
-    post['comments_count'] = get_post_comments_count(post['id'])
-    post['user_liked'] = user_liked_post(current_user.id, post['id'])
-    post['user_disliked'] = user_disliked_post(current_user.id, post['id'])
-    
-    return render_template("post_detail.html", post=post, user=current_user, post_user=user, comments=comments, page="Post")
+    # Author and the viewer's reaction (counts are already on the post row)
+    hydrated = hydrate_posts([post], current_user.id)
+    if not hydrated:
+        flash("Post not found.", category="error")
+        return redirect(url_for("views.home"))
+    user = hydrated[0]['user']
+
+    # One page of comments with their first replies, authors and like counts
+    comments, comments_cursor = get_comment_tree(id, comments_cursor)
+
+    response = render_template(
+        "post_detail.html",
+        post=post,
+        user=current_user,
+        post_user=user,
+        comments=comments,
+        comments_cursor=comments_cursor,
+        page="Post"
+    )
+    return with_etag(response, etag)
+
+
+@views.route("/comment/<int:id>/replies")
+@login_required
+def comment_replies(id):
+    comment = get_comment_by_id(id)
+    if not comment:
+        flash("Comment not found.", category="error")
+        return redirect(url_for("views.home"))
+
+    comment['user'] = get_user_by_id(comment['user_id'])
+    replies, next_cursor = get_comment_replies(id, request.args.get("cursor"))
+
+    return render_template(
+        "comment_replies.html",
+        user=current_user,
+        comment=comment,
+        replies=replies,
+        next_cursor=next_cursor,
+        page="Replies"
+    )
 
 
 # ---------------- COMMENTS ----------------
@@ -537,18 +727,41 @@ def send_friend_request_route(user_id):
 @views.route("/accept_friend_request/<int:request_id>", methods=["POST"])
 @login_required
 def accept_friend_request_route(request_id):
-    from .models import accept_friend_request
-    accept_friend_request(request_id)
-    flash("Friend request accepted!", category="success")
+    if accept_friend_requests(current_user.id, [request_id]):
+        flash("Friend request accepted!", category="success")
     return redirect(url_for('views.friend_requests'))
 
 
 @views.route("/reject_friend_request/<int:request_id>", methods=["POST"])
 @login_required
 def reject_friend_request_route(request_id):
-    from .models import reject_friend_request
-    reject_friend_request(request_id)
-    flash("Friend request rejected.", category="info")
+    if reject_friend_requests(current_user.id, [request_id]):
+        flash("Friend request rejected.", category="info")
+    return redirect(url_for('views.friend_requests'))
+
+
+BULK_REQUEST_ACTIONS = {
+    # action -> (model function, past tense for the flash message)
+    'accept': (accept_friend_requests, "accepted"),
+    'reject': (reject_friend_requests, "rejected"),
+    'cancel': (cancel_friend_requests, "cancelled"),
+}
+
+
+@views.route("/friend_requests/bulk", methods=["POST"])
+@login_required
+@query_budget(5)
+def bulk_friend_requests():
+    # Accept/reject only act on requests sent to the current user, cancel on ones they sent
+    action = BULK_REQUEST_ACTIONS.get(request.form.get("action"))
+    request_ids = [int(i) for i in request.form.getlist("request_ids") if i.isdigit()]
+    if not action or not request_ids:
+        flash("Select at least one request.", category="error")
+        return redirect(url_for('views.friend_requests'))
+
+    function, done = action
+    count = function(current_user.id, request_ids)
+    flash(f"{count} friend request{'s' if count != 1 else ''} {done}.", category="success")
     return redirect(url_for('views.friend_requests'))
 
 